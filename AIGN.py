@@ -1,174 +1,376 @@
-import os
+import copy
 import re
-import time
-from typing import Optional
-
-import agentscope
-from agentscope.agents import AgentBase, DialogAgent, UserAgent
-from agentscope.message import Msg
-from agentscope.prompt import PromptEngine, PromptType
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+from AIGN_Context import ContextBuilder
+from AIGN_Index import ParagraphIndex
+from AIGN_Journal import NovelJournal
 from AIGN_Prompt import *
+from AIGN_Retry import RetryPolicy
+from AIGN_Select import selectDraft
+from AIGN_Stream import StreamingPolisher
+from AIGN_Text import NovelText
 
 
-def Retryer(func, max_retries=10):
-    def wrapper(*args, **kwargs):
-        for _ in range(max_retries):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                print("-" * 30 + f"\n失败：\n{e}\n" + "-" * 30)
-                time.sleep(2.333)
-        raise ValueError("失败")
+# agentscope 导入较慢，MarkdownAgent 等在第一次用到时才从 AIGN_Agent 导入
+_agent_exports = {
+    "INPUT_STABILITY",
+    "orderInputs",
+    "newUsage",
+    "addUsage",
+    "MarkdownStreamParser",
+    "MarkdownAgent",
+}
 
-    return wrapper
 
+def __getattr__(name):
+    if name in _agent_exports:
+        import AIGN_Agent
 
-class MarkdownAgent(AgentBase):
-    """专门应对输入输出都是md格式的情况，例如小说生成"""
+        return getattr(AIGN_Agent, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    def __init__(
-        self,
-        chatLLM,
-        sys_prompt: str,
-        name: str,
-        temperature=0.8,
-        top_p=0.8,
-        use_memory=False,
-        first_replay="明白了。",
-        # first_replay=None,
-        is_speak=True,
-    ) -> None:
-        super().__init__(name=name, use_memory=False)
 
-        self.chatLLM = chatLLM
-        self.sys_prompt = sys_prompt
-        self.temperature = temperature
-        self.top_p = top_p
-        self.use_memory = use_memory
-        self.is_speak = is_speak
+def Retryer(func, max_retries=10):
+    """兼容旧接口，等价于 RetryPolicy(max_attempts=max_retries).wrap(func)"""
+    return RetryPolicy(max_attempts=max_retries).wrap(func)
+
+
+# 需要持久化的 AIGN 状态，paragraph_list 单独处理
+STATE_FIELDS = [
+    "user_idea",
+    "user_requriments",
+    "embellishment_idea",
+    "novel_outline",
+    "writing_plan",
+    "temp_setting",
+    "writing_memory",
+    "no_memory_paragraph",
+]
+
+
+# 各 agent 输入中可以裁剪的字段，数字越小越先被裁剪
+CONTEXT_PRIORITIES = {
+    "NovelBeginningWriter": {"用户想法": 1, "小说大纲": 2},
+    "NovelWriter": {
+        "相关前文": 0,
+        "用户想法": 1,
+        "上文内容": 2,
+        "前文记忆": 3,
+        "大纲": 4,
+    },
+    "NovelFusedWriter": {
+        "相关前文": 0,
+        "用户想法": 1,
+        "上文内容": 2,
+        "前文记忆": 3,
+        "大纲": 4,
+    },
+    "NovelEmbellisher": {"上文": 1, "大纲": 2},
+    "MemoryMaker": {"前文记忆": 1},
+    "ChapterPlanner": {"用户想法": 1, "大纲": 2},
+    "ChapterBridgeWriter": {"大纲": 1, "上一章结尾": 2, "下一章开头": 3},
+}
+# 各 agent 输入的默认 token 预算
+CONTEXT_BUDGETS = {
+    "NovelBeginningWriter": 8000,
+    "NovelWriter": 12000,
+    "NovelFusedWriter": 12000,
+    "NovelEmbellisher": 12000,
+    "MemoryMaker": 8000,
+    "ChapterPlanner": 12000,
+    "ChapterBridgeWriter": 8000,
+}
+
+
+def makeContextBuilder(name, context_budgets):
+    budget = context_budgets.get(name)
+    if budget is None:
+        return None
+    return ContextBuilder(budget, CONTEXT_PRIORITIES.get(name, {}))
+
+
+_chapter_line = re.compile(r"^(第\s*\d+\s*章[^：:]*)[：:]\s*(.*)$")
+_chapter_setting = re.compile(r"\s*[|｜]\s*设定\s*[：:]\s*")
+
+
+def parseChapters(text: str) -> list:
+    """
+    解析章节规划，每行一章，返回 [{"title": 标题, "summary": 概要, "setting": 临时设定}]
+    没有“｜设定：”部分的行临时设定为空
+    """
+    chapters = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        m = _chapter_line.match(line)
+        if m:
+            title, summary = m.group(1).strip(), m.group(2)
+        else:
+            title, summary = f"第{len(chapters) + 1}章", line
+        summary, *setting = _chapter_setting.split(summary, maxsplit=1)
+        setting = setting[0].strip() if setting else ""
+        chapters.append({"title": title, "summary": summary, "setting": setting})
+    return chapters
 
-        self.history = [{"role": "user", "content": self.sys_prompt}]
 
-        if first_replay:
-            self.history.append({"role": "assistant", "content": first_replay})
-        else:
-            resp = chatLLM(messages=self.history)
-            self.history.append({"role": "assistant", "content": resp["content"]})
-            if self.is_speak:
-                self.speak(Msg(self.name, resp["content"]))
-
-    def query(self, user_input: str) -> str:
-        resp = self.chatLLM(
-            messages=self.history + [{"role": "user", "content": user_input}],
-            temperature=self.temperature,
-            top_p=self.top_p,
-        )
-        if self.use_memory:
-            self.history.append({"role": "user", "content": user_input})
-            self.history.append({"role": "assistant", "content": resp["content"]})
-
-        return resp
-
-    def getOutput(self, input_content: str, output_keys: list) -> dict:
-        """解析类md格式中 # key 的内容，未解析全部output_keys中的key会报错"""
-        resp = self.query(input_content)
-        output = resp["content"]
-
-        lines = output.split("\n")
-        sections = {}
-        current_section = ""
-        for line in lines:
-            if line.startswith("# ") or line.startswith(" # "):
-                # new key
-                current_section = line[2:].strip()
-                sections[current_section] = []
-            else:
-                # add content to current key
-                if current_section:
-                    sections[current_section].append(line.strip())
-        for key in sections.keys():
-            sections[key] = "\n".join(sections[key]).strip()
-
-        for k in output_keys:
-            if (k not in sections) or (len(sections[k]) == 0):
-                raise ValueError(f"fail to parse {k} in output:\n{output}\n\n")
-
-        if self.is_speak:
-            self.speak(
-                Msg(
-                    self.name,
-                    f"total_tokens: {resp['total_tokens']}\n{resp['content']}\n",
-                )
-            )
-        return sections
+_background_executor = None
+_background_lock = threading.Lock()
 
-    def invoke(self, inputs: dict, output_keys: list) -> dict:
-        input_content = ""
-        for k, v in inputs.items():
-            if isinstance(v, str) and len(v) > 0:
-                input_content += f"# {k}\n{v}\n\n"
 
-        result = Retryer(self.getOutput)(input_content, output_keys)
+def getBackgroundExecutor() -> ThreadPoolExecutor:
+    """进程内共享的后台线程池，用于流水线模式"""
+    global _background_executor
+    with _background_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=32)
+        return _background_executor
 
-        return result
 
-    def clear_memory(self):
-        if self.use_memory:
-            self.history = self.history[:2]
+# token 预算 -> agent，只保留最近用到的 MAX_SHARED_AGENT_SETS 组
+MAX_SHARED_AGENT_SETS = 16
+_shared_agents = OrderedDict()
+_shared_agents_lock = threading.RLock()
+_agentscope_initialized = False
 
 
-class AIGN:
-    def __init__(self, chatLLM):
-        agentscope.init()
-        self.chatLLM = chatLLM
+def initAgentscope():
+    """每个进程只初始化一次 agentscope"""
+    global _agentscope_initialized
+    with _shared_agents_lock:
+        if not _agentscope_initialized:
+            import agentscope
 
-        self.novel_outline = ""
-        self.paragraph_list = []
-        self.novel_content = ""
-        self.writing_plan = ""
-        self.temp_setting = ""
-        self.writing_memory = ""
-        self.no_memory_paragraph = ""
-        self.user_idea = ""
-        self.user_requriments = ""
-        self.embellishment_idea = ""
+            agentscope.init()
+            _agentscope_initialized = True
 
-        self.novel_outline_writer = MarkdownAgent(
-            chatLLM=self.chatLLM,
+
+AGENT_NAMES = [
+    "novel_outline_writer",
+    "novel_beginning_writer",
+    "novel_writer",
+    "novel_fused_writer",
+    "novel_embellisher",
+    "memory_maker",
+    "chapter_planner",
+    "chapter_bridge_writer",
+]
+
+
+def makeAgents(chatLLM, context_budgets) -> dict:
+    from AIGN_Agent import MarkdownAgent
+
+    return {
+        "novel_outline_writer": MarkdownAgent(
+            chatLLM=chatLLM,
             sys_prompt=novel_outline_writer_prompt,
             name="NovelOutlineWriter",
             temperature=0.98,
-        )
-        self.novel_beginning_writer = MarkdownAgent(
-            chatLLM=self.chatLLM,
+            prefix_stable=True,
+        ),
+        "novel_beginning_writer": MarkdownAgent(
+            chatLLM=chatLLM,
             sys_prompt=novel_beginning_writer_prompt,
             name="NovelBeginningWriter",
             temperature=0.80,
-        )
-        self.novel_writer = MarkdownAgent(
-            chatLLM=self.chatLLM,
+            repair=True,
+            context_builder=makeContextBuilder("NovelBeginningWriter", context_budgets),
+            prefix_stable=True,
+        ),
+        "novel_writer": MarkdownAgent(
+            chatLLM=chatLLM,
             sys_prompt=novel_writer_prompt,
             name="NovelWriter",
             temperature=0.81,
-        )
-        self.novel_embellisher = MarkdownAgent(
-            chatLLM=self.chatLLM,
+            repair=True,
+            context_builder=makeContextBuilder("NovelWriter", context_budgets),
+            prefix_stable=True,
+        ),
+        "novel_fused_writer": MarkdownAgent(
+            chatLLM=chatLLM,
+            sys_prompt=novel_fused_writer_prompt,
+            name="NovelFusedWriter",
+            temperature=0.85,
+            repair=True,
+            context_builder=makeContextBuilder("NovelFusedWriter", context_budgets),
+            prefix_stable=True,
+        ),
+        "novel_embellisher": MarkdownAgent(
+            chatLLM=chatLLM,
             sys_prompt=novel_embellisher_prompt,
             name="NovelEmbellisher",
             temperature=0.92,
-        )
-        self.memory_maker = MarkdownAgent(
-            chatLLM=self.chatLLM,
+            context_builder=makeContextBuilder("NovelEmbellisher", context_budgets),
+            prefix_stable=True,
+        ),
+        "memory_maker": MarkdownAgent(
+            chatLLM=chatLLM,
             sys_prompt=memory_maker_prompt,
             name="MemoryMaker",
             temperature=0.66,
-        )
+            context_builder=makeContextBuilder("MemoryMaker", context_budgets),
+            prefix_stable=True,
+        ),
+        "chapter_planner": MarkdownAgent(
+            chatLLM=chatLLM,
+            sys_prompt=chapter_planner_prompt,
+            name="ChapterPlanner",
+            temperature=0.7,
+            context_builder=makeContextBuilder("ChapterPlanner", context_budgets),
+            prefix_stable=True,
+        ),
+        "chapter_bridge_writer": MarkdownAgent(
+            chatLLM=chatLLM,
+            sys_prompt=chapter_bridge_prompt,
+            name="ChapterBridgeWriter",
+            temperature=0.8,
+            context_builder=makeContextBuilder("ChapterBridgeWriter", context_budgets),
+            prefix_stable=True,
+        ),
+    }
+
+
+def getSharedAgents(context_budgets=None) -> dict:
+    """
+    相同 token 预算的 AIGN 共享同一组 agent，每个进程只创建一次
+    context_budgets 只需给出要修改的 agent，其余用 CONTEXT_BUDGETS 中的默认值，值为 None 时不裁剪
+    共享的 agent 不保存 chatLLM，由每个会话的 SessionAgent 传入，所以缓存不会持有 chatLLM
+    """
+    context_budgets = {**CONTEXT_BUDGETS, **(context_budgets or {})}
+    key = tuple(sorted(context_budgets.items()))
+    with _shared_agents_lock:
+        agents = _shared_agents.get(key)
+        if agents is None:
+            initAgentscope()
+            agents = _shared_agents[key] = makeAgents(None, context_budgets)
+            while len(_shared_agents) > MAX_SHARED_AGENT_SETS:
+                _shared_agents.popitem(last=False)
+        _shared_agents.move_to_end(key)
+        return agents
+
+
+class SessionAgent:
+    """
+    共享 MarkdownAgent 在单个会话中的视图，保存本会话的 chatLLM、stream 设置和对话记忆
+    其余属性只读地转发给共享的 agent，复制会话时不会复制 agent
+    last_call 为本会话最近一次调用的 AgentCall，包含用量、context_report 等
+    """
+
+    __slots__ = ("agent", "chatLLM", "stream", "memory", "last_call")
+
+    def __init__(self, agent, chatLLM=None, stream=None, memory=None):
+        self.agent = agent
+        self.chatLLM = chatLLM
+        self.stream = stream
+        if memory is None and agent.memory is not None:
+            memory = agent.memory.fork()
+        self.memory = memory
+        self.last_call = None
+
+    def __getattr__(self, name):
+        if name in SessionAgent.__slots__:
+            raise AttributeError(name)
+        return getattr(self.agent, name)
+
+    def __deepcopy__(self, memo):
+        # 新会话的对话记忆从空开始
+        return SessionAgent(self.agent, self.chatLLM, self.stream)
+
+    def invoke(self, inputs: dict, output_keys: list, on_partial=None) -> dict:
+        call = self.agent.newCall(self.chatLLM, on_partial, self.stream, self.memory)
+        self.last_call = call
+        return self.agent.invoke(inputs, output_keys, call=call)
+
+
+class AIGN:
+    def __init__(
+        self,
+        chatLLM,
+        journal_path=None,
+        context_budgets=None,
+        pipeline=False,
+        num_drafts=1,
+        retrieval_length=0,
+        fused=False,
+        stream=False,
+    ):
+        self.chatLLM = chatLLM
+
+        self.novel_outline = ""
+        self.novel_text = NovelText()
+        self.writing_plan = ""
+        self.temp_setting = ""
+        self.writing_memory = ""
+        self.no_memory_paragraph = ""
+        self.user_idea = ""
+        self.user_requriments = ""
+        self.embellishment_idea = ""
+
+        # 只追加的检查点日志，为 None 时不记录
+        self.journal = NovelJournal(journal_path) if journal_path else None
+        self.recorded_state = {k: "" for k in STATE_FIELDS}
+        self.recorded_paragraphs = 0
+
+        # pipeline 为 True 时 genNextParagraph 也在后台更新记忆
+        self.pipeline = pipeline
+        self.memory_pending = None
+        self.memory_start = 0
+
+        # num_drafts > 1 时并发写多份草稿，本地打分后只润色最好的一份
+        self.num_drafts = num_drafts
+        self.draft_scores = []
+
+        # fused 为 True 且没有润色要求时，一次调用直接写出润色后的段落
+        self.fused = fused
+
+        # genChapters 拆分出的章节
+        self.chapters = []
+
+        # retrieval_length > 0 时，从上文内容之前的正文中检索与计划相关的片段给写作者
+        self.retrieval_length = retrieval_length
+        self.paragraph_index = ParagraphIndex() if retrieval_length > 0 else None
+
+        # stream 为 True 时所有 agent 流式输出，解析完 # END 后立即关闭流
+        self.stream = stream
+
+        # agent 在进程内共享，会话中只保存可以单独替换 chatLLM 的视图
+        # novel_outline_writer、novel_writer 等属性见 AGENT_NAMES
+        agents = getSharedAgents(context_budgets)
+        for name in AGENT_NAMES:
+            setattr(self, name, SessionAgent(agents[name], chatLLM, stream))
+
+    def __deepcopy__(self, memo):
+        """
+        gradio 为每个会话复制一份 AIGN，大部分字段是不可变的字符串或进程内共享的对象，
+        只复制会话中会被修改的部分
+        """
+        new = copy.copy(self)
+        new.novel_text = NovelText(self.paragraph_list)
+        new.recorded_state = dict(self.recorded_state)
+        new.draft_scores = list(self.draft_scores)
+        new.journal = copy.deepcopy(self.journal, memo)
+        new.paragraph_index = copy.deepcopy(self.paragraph_index, memo)
+        for name in AGENT_NAMES:
+            setattr(new, name, copy.deepcopy(getattr(self, name), memo))
+        return new
+
+    @property
+    def paragraph_list(self) -> list:
+        return self.novel_text.paragraphs
+
+    @paragraph_list.setter
+    def paragraph_list(self, paragraphs):
+        self.novel_text = NovelText(paragraphs)
+
+    @property
+    def novel_content(self) -> str:
+        """全文，读取时才拼接"""
+        return self.novel_text.text
 
     def updateNovelContent(self):
-        self.novel_content = ""
-        for paragraph in self.paragraph_list:
-            self.novel_content += f"{paragraph}\n\n"
         return self.novel_content
 
     def genNovelOutline(self, user_idea=None):
@@ -179,6 +381,7 @@ class AIGN:
             output_keys=["大纲"],
         )
         self.novel_outline = resp["大纲"]
+        self.recordNovel()
         return self.novel_outline
 
     def genBeginning(self, user_requriments=None, embellishment_idea=None):
@@ -212,21 +415,67 @@ class AIGN:
         beginning = resp["润色结果"]
 
         self.paragraph_list.append(beginning)
-        self.updateNovelContent()
+        self.recordNovel()
 
         return beginning
 
     def getLastParagraph(self, max_length=2000):
-        last_paragraph = ""
-
-        for i in range(0, len(self.paragraph_list)):
-            if (len(last_paragraph) + len(self.paragraph_list[-1 - i])) < max_length:
-                last_paragraph = self.paragraph_list[-1 - i] + "\n" + last_paragraph
-            else:
-                break
-        return last_paragraph
+        return self.novel_text.tail(max_length)
+
+    @classmethod
+    def resume(cls, chatLLM, journal_path, **kwargs):
+        """从检查点日志恢复，日志不存在时等价于新建，kwargs 传给 AIGN"""
+        aign = cls(chatLLM, journal_path, **kwargs)
+        state = aign.journal.load()
+        if state:
+            aign.loadState(state)
+        return aign
+
+    def stateValue(self, k: str) -> str:
+        """
+        需要持久化的字段值：后台记忆更新合并之前，正在总结的段落既不在 writing_memory 中，
+        也已经移出了 no_memory_paragraph，记录时仍算作 no_memory_paragraph
+        """
+        value = getattr(self, k)
+        if k == "no_memory_paragraph" and self.memory_pending is not None:
+            value = self.memory_pending[1] + value
+        return value
+
+    def getState(self) -> dict:
+        state = {k: self.stateValue(k) for k in STATE_FIELDS}
+        state["paragraph_list"] = list(self.paragraph_list)
+        return state
+
+    def loadState(self, state: dict):
+        for k in STATE_FIELDS:
+            setattr(self, k, state.get(k, ""))
+        self.paragraph_list = state.get("paragraph_list", [])
+        self.recorded_state = {k: getattr(self, k) for k in STATE_FIELDS}
+        self.recorded_paragraphs = len(self.paragraph_list)
 
     def recordNovel(self):
+        """把上次记录之后的变化追加到检查点日志"""
+        if self.journal is None:
+            return
+
+        if len(self.paragraph_list) < self.recorded_paragraphs:
+            # 段落被删除，无法用追加表示，直接压缩成快照
+            self.journal.compact(self.getState())
+        else:
+            state = {k: self.stateValue(k) for k in STATE_FIELDS}
+            fields = {k: v for k, v in state.items() if v != self.recorded_state[k]}
+            paragraphs = self.paragraph_list[self.recorded_paragraphs :]
+            if fields or paragraphs:
+                self.journal.append(
+                    {"type": "update", "fields": fields, "paragraphs": paragraphs}
+                )
+            if self.journal.needCompact():
+                self.journal.compact(self.getState())
+
+        self.recorded_state = {k: self.stateValue(k) for k in STATE_FIELDS}
+        self.recorded_paragraphs = len(self.paragraph_list)
+
+    def exportNovel(self, path="novel_record.md"):
         record_content = ""
         record_content += f"# 大纲\n\n{self.novel_outline}\n\n"
         record_content += f"# 正文\n\n"
@@ -235,11 +484,16 @@ class AIGN:
         record_content += f"# 计划\n\n{self.writing_plan}\n\n"
         record_content += f"# 临时设定\n\n{self.temp_setting}\n\n"
 
-        with open("novel_record.md", "w", encoding="utf-8") as f:
+        with open(path, "w", encoding="utf-8") as f:
             f.write(record_content)
 
-    def updateMemory(self):
+    def updateMemory(self, background=None):
+        if background is None:
+            background = self.pipeline
         if (len(self.no_memory_paragraph)) > 2000:
+            if background:
+                self.updateMemoryInBackground()
+                return
             resp = self.memory_maker.invoke(
                 inputs={
                     "前文记忆": self.writing_memory,
@@ -249,50 +503,391 @@ class AIGN:
             )
             self.writing_memory = resp["新的记忆"]
             self.no_memory_paragraph = ""
+            self.memory_start = len(self.paragraph_list)
+
+    def updateMemoryInBackground(self):
+        """
+        在后台更新记忆。一致性规则：
+        - 同一时间最多一个记忆更新，新的更新开始前先合并上一个
+        - 正在总结的段落从 no_memory_paragraph 中移出，失败时放回；合并之前检查点中仍记录它们
+        - 写下一段前，如果正在总结的段落已经不全在上文内容中，先等待并合并
+        """
+        self.syncMemory()
+        text = self.no_memory_paragraph
+        self.no_memory_paragraph = ""
+        future = getBackgroundExecutor().submit(
+            self.memory_maker.invoke,
+            inputs={
+                "前文记忆": self.writing_memory,
+                "正文内容": text,
+            },
+            output_keys=["新的记忆"],
+        )
+        self.memory_pending = (future, text, len(self.paragraph_list))
+
+    def syncMemory(self):
+        """等待后台记忆更新完成并合并"""
+        if self.memory_pending is None:
+            return
+        future, text, end = self.memory_pending
+        self.memory_pending = None
+        try:
+            resp = future.result()
+        except Exception:
+            self.no_memory_paragraph = text + self.no_memory_paragraph
+            raise
+        self.writing_memory = resp["新的记忆"]
+        self.memory_start = end
+        self.recordNovel()
 
-    def genNextParagraph(self, user_requriments=None, embellishment_idea=None):
-        if user_requriments:
-            self.user_requriments = user_requriments
-        if embellishment_idea:
-            self.embellishment_idea = embellishment_idea
+    def syncMemoryIfNeeded(self, drafts=()):
+        """正在总结的段落有一部分不在上文内容中时，写作前必须先合并记忆"""
+        if self.memory_pending is None:
+            return
+        if self.memory_start < self.novel_text.tailStart(2000, drafts):
+            self.syncMemory()
+
+    def retrieveRelated(self, query: str, drafts=()) -> str:
+        """检索上文内容之前、与 query（计划和临时设定）相关的正文片段"""
+        if self.paragraph_index is None:
+            return ""
+        self.paragraph_index.sync(self.paragraph_list)
+        return self.paragraph_index.retrieve(
+            query,
+            max_length=self.retrieval_length,
+            before=self.novel_text.tailStart(2000, drafts),
+        )
 
-        resp = self.novel_writer.invoke(
+    def useFused(self) -> bool:
+        """有润色要求时需要单独的润色步骤，回到写作+润色两步"""
+        return self.fused and not self.embellishment_idea
+
+    def writeParagraph(self, pending=None, fused=False, on_partial=None) -> dict:
+        """
+        写下一段草稿，pending 为已经写好但尚未提交的草稿，它的段落、计划和临时设定视为最新状态
+        fused 为 True 时用 novel_fused_writer 直接写出润色后的段落
+        on_partial 不为 None 时流式输出，只写一份草稿时才会被调用
+        """
+        writer = self.novel_fused_writer if fused else self.novel_writer
+        drafts = (pending["段落"],) if pending else ()
+        plan = pending["计划"] if pending else self.writing_plan
+        setting = pending["临时设定"] if pending else self.temp_setting
+        self.syncMemoryIfNeeded(drafts)
+        last_paragraph = self.novel_text.tail(2000, drafts)
+        inputs = {
+            "相关前文": self.retrieveRelated(f"{plan}\n{setting}", drafts),
+            "用户想法": self.user_idea,
+            "大纲": self.novel_outline,
+            "前文记忆": self.writing_memory,
+            "临时设定": setting,
+            "计划": plan,
+            "用户要求": self.user_requriments,
+            "上文内容": last_paragraph,
+        }
+        output_keys = ["段落", "计划", "临时设定"]
+        if self.num_drafts <= 1:
+            return writer.invoke(
+                inputs=inputs, output_keys=output_keys, on_partial=on_partial
+            )
+
+        futures = [
+            getBackgroundExecutor().submit(
+                writer.invoke, inputs=inputs, output_keys=output_keys
+            )
+            for _ in range(self.num_drafts)
+        ]
+        candidates = []
+        error = None
+        for future in futures:
+            try:
+                candidates.append(future.result())
+            except Exception as e:
+                error = e
+        if not candidates:
+            raise error
+        draft, self.draft_scores = selectDraft(
+            candidates, plan=plan, context=last_paragraph
+        )
+        return draft
+
+    def embellishParagraph(self, draft: dict, last_paragraph: str) -> str:
+        resp = self.novel_embellisher.invoke(
             inputs={
-                "用户想法": self.user_idea,
                 "大纲": self.novel_outline,
-                "前文记忆": self.writing_memory,
-                "临时设定": self.temp_setting,
-                "计划": self.writing_plan,
-                "用户要求": self.user_requriments,
-                "上文内容": self.getLastParagraph(),
+                "临时设定": draft["临时设定"],
+                "计划": draft["计划"],
+                "润色要求": self.embellishment_idea,
+                "上文": last_paragraph,
+                "要润色的内容": draft["段落"],
             },
-            output_keys=["段落", "计划", "临时设定"],
+            output_keys=["润色结果"],
         )
-        next_paragraph = resp["段落"]
-        next_writing_plan = resp["计划"]
-        next_temp_setting = resp["临时设定"]
+        return resp["润色结果"]
 
+    def embellishChunk(self, last_paragraph: str, context: str, chunk: str) -> str:
+        """润色流式草稿中的一块，context 为这一块之前的草稿"""
         resp = self.novel_embellisher.invoke(
             inputs={
                 "大纲": self.novel_outline,
-                "临时设定": next_temp_setting,
-                "计划": next_writing_plan,
-                "润色要求": embellishment_idea,
-                "上文": self.getLastParagraph(),
-                "要润色的内容": next_paragraph,
+                "临时设定": self.temp_setting,
+                "计划": self.writing_plan,
+                "润色要求": (
+                    f"{self.embellishment_idea}\n{chunk_embellish_requirement}"
+                ).strip(),
+                "上文": f"{last_paragraph}\n{context}"[-2000:],
+                "要润色的内容": chunk,
             },
             output_keys=["润色结果"],
         )
-        next_paragraph = resp["润色结果"]
+        return resp["润色结果"]
 
-        self.paragraph_list.append(next_paragraph)
-        self.writing_plan = next_writing_plan
-        self.temp_setting = next_temp_setting
+    def genNextParagraphStreaming(
+        self,
+        on_polished=None,
+        chunk_chars=800,
+        user_requriments=None,
+        embellishment_idea=None,
+        on_reset=None,
+    ):
+        """
+        写作者流式输出段落，每攒够 chunk_chars 字的完整句子就交给润色者，
+        各块并发润色，按顺序拼接成下一段
+        on_polished(text) 在每块润色结果按顺序可用时调用，第一块大约在一次生成之后就能拿到，
+        而不是等写作和润色两次完整生成；写作者重试时调用 on_reset()，之前收到的块作废
+        润色时用的是本段的计划和临时设定，写作者输出的新计划在提交时才更新
+        """
+        if user_requriments:
+            self.user_requriments = user_requriments
+        if embellishment_idea:
+            self.embellishment_idea = embellishment_idea
+
+        if self.useFused():
+            draft = self.writeParagraph(fused=True)
+            next_paragraph = draft["段落"]
+            if on_polished is not None:
+                on_polished(next_paragraph)
+        else:
+            last_paragraph = self.getLastParagraph()
+            polisher = StreamingPolisher(
+                lambda context, chunk: self.embellishChunk(
+                    last_paragraph, context, chunk
+                ),
+                getBackgroundExecutor(),
+                chunk_chars=chunk_chars,
+                on_polished=on_polished,
+                on_reset=on_reset,
+            )
+            draft = self.writeParagraph(
+                on_partial=lambda name, sections: polisher.feed(
+                    sections.get("段落", "")
+                )
+            )
+            next_paragraph = polisher.finish(draft["段落"])
+
+        self.writing_plan = draft["计划"]
+        self.temp_setting = draft["临时设定"]
+        self.commitParagraph(next_paragraph)
 
+        return next_paragraph
+
+    def commitParagraph(self, next_paragraph: str, background=None):
+        self.paragraph_list.append(next_paragraph)
         self.no_memory_paragraph += f"\n{next_paragraph}"
 
-        self.updateMemory()
-        self.updateNovelContent()
+        self.updateMemory(background)
         self.recordNovel()
 
+    def genNextParagraph(self, user_requriments=None, embellishment_idea=None):
+        if user_requriments:
+            self.user_requriments = user_requriments
+        if embellishment_idea:
+            self.embellishment_idea = embellishment_idea
+
+        if self.useFused():
+            draft = self.writeParagraph(fused=True)
+            next_paragraph = draft["段落"]
+        else:
+            draft = self.writeParagraph()
+            next_paragraph = self.embellishParagraph(draft, self.getLastParagraph())
+
+        self.writing_plan = draft["计划"]
+        self.temp_setting = draft["临时设定"]
+        self.commitParagraph(next_paragraph)
+
         return next_paragraph
+
+    def genParagraphsPipelined(self, n, user_requriments=None, embellishment_idea=None):
+        """
+        流水线地生成 n 段，按顺序逐段 yield 润色后的段落，记忆总在后台更新
+        第 k 段的润色与第 k+1 段的写作同时进行：润色不改变计划和临时设定，
+        所以第 k+1 段写作时只有上文内容用的是第 k 段的草稿
+        """
+        if user_requriments:
+            self.user_requriments = user_requriments
+        if embellishment_idea:
+            self.embellishment_idea = embellishment_idea
+
+        if self.useFused():
+            # 没有润色步骤，写完一段直接提交，记忆仍在后台更新
+            for _ in range(n):
+                draft = self.writeParagraph(fused=True)
+                self.writing_plan = draft["计划"]
+                self.temp_setting = draft["临时设定"]
+                self.commitParagraph(draft["段落"], background=True)
+                yield draft["段落"]
+            self.syncMemory()
+            return
+
+        # 正在润色、尚未提交的 (future, 草稿)；草稿的计划和临时设定在提交时才写入状态，
+        # 调用方提前关闭生成器或出错时，状态停在最后一个提交的段落
+        pending = None
+        try:
+            for _ in range(n):
+                draft = self.writeParagraph(pending[1] if pending else None)
+                if pending:
+                    next_paragraph = self.commitPending(pending)
+                    pending = None
+                    yield next_paragraph
+
+                pending = (
+                    getBackgroundExecutor().submit(
+                        self.embellishParagraph, draft, self.getLastParagraph()
+                    ),
+                    draft,
+                )
+
+            if pending:
+                next_paragraph = self.commitPending(pending)
+                pending = None
+                yield next_paragraph
+        finally:
+            if pending:
+                pending[0].cancel()
+        self.syncMemory()
+
+    def commitPending(self, pending) -> str:
+        """等待流水线中的润色完成，连同草稿的计划和临时设定一起提交"""
+        future, draft = pending
+        next_paragraph = future.result()
+        self.writing_plan = draft["计划"]
+        self.temp_setting = draft["临时设定"]
+        self.commitParagraph(next_paragraph, background=True)
+        return next_paragraph
+
+    def planChapters(self, num_chapters: int) -> list:
+        resp = self.chapter_planner.invoke(
+            inputs={
+                "用户想法": self.user_idea,
+                "大纲": self.novel_outline,
+                "用户要求": self.user_requriments,
+                "章节数": str(num_chapters),
+            },
+            output_keys=["章节"],
+        )
+        return parseChapters(resp["章节"])
+
+    def newChapterSession(self, k: int) -> "AIGN":
+        """
+        第 k 章的独立会话，共享 agent，不写检查点日志
+        前文记忆用前面各章的概要代替，计划和临时设定用本章的概要和设定作为种子
+        """
+        chapter = self.chapters[k]
+        session = copy.deepcopy(self)
+        session.journal = None
+        session.paragraph_list = []
+        session.memory_pending = None
+        session.memory_start = 0
+        session.no_memory_paragraph = ""
+        if self.retrieval_length > 0:
+            session.paragraph_index = ParagraphIndex()
+        session.writing_memory = "\n".join(
+            f"{c['title']}：{c['summary']}" for c in self.chapters[:k]
+        )
+        session.writing_plan = chapter["summary"]
+        session.temp_setting = chapter.get("setting", "")
+        session.user_requriments = (
+            f"{self.user_requriments}\n"
+            f"当前在写{chapter['title']}，只写本章的剧情：{chapter['summary']}\n"
+            "不要写之后章节的内容。"
+        ).strip()
+        return session
+
+    def genChapter(self, k: int, chapter_length: int) -> "AIGN":
+        session = self.newChapterSession(k)
+        if k == 0:
+            session.genBeginning()
+        # 每章至少一段，章节之间的过渡需要下一章的开头
+        while not session.paragraph_list or len(session.novel_text) < chapter_length:
+            session.genNextParagraph()
+        session.syncMemory()
+        return session
+
+    def bridgeChapters(self, sessions: list, k: int) -> str:
+        """第 k-1 章与第 k 章之间的过渡段落"""
+        resp = self.chapter_bridge_writer.invoke(
+            inputs={
+                "大纲": self.novel_outline,
+                "下一章概要": self.chapters[k]["summary"],
+                "上一章结尾": sessions[k - 1].getLastParagraph(1000),
+                "下一章开头": sessions[k].paragraph_list[0],
+            },
+            output_keys=["过渡"],
+        )
+        return resp["过渡"]
+
+    def genChapters(
+        self,
+        num_chapters: int,
+        target_length: int,
+        max_workers=4,
+        user_requriments=None,
+        embellishment_idea=None,
+    ) -> list:
+        """
+        按章节并发生成整部小说，只能用于还没有正文的小说
+        1. 规划：把大纲拆成 num_chapters 章，每章有标题、概要和开头的临时设定
+        2. 写作：各章在 max_workers 个线程中同时写，每章约 target_length / 章节数 字，至少一段
+        3. 衔接：为相邻两章写过渡段落，放在下一章开头
+        总耗时取决于最慢的一章，而不是总段落数
+        """
+        if self.paragraph_list:
+            raise ValueError("genChapters 只能用于还没有正文的小说")
+        if user_requriments:
+            self.user_requriments = user_requriments
+        if embellishment_idea:
+            self.embellishment_idea = embellishment_idea
+        if not self.novel_outline:
+            self.genNovelOutline()
+
+        self.chapters = self.planChapters(num_chapters)
+        num_chapters = len(self.chapters)
+        chapter_length = target_length // num_chapters
+        # 章节内部可能用到后台线程池，章节本身使用单独的线程池，避免互相等待
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            sessions = list(
+                executor.map(
+                    lambda k: self.genChapter(k, chapter_length), range(num_chapters)
+                )
+            )
+            bridges = [""] + list(
+                executor.map(
+                    lambda k: self.bridgeChapters(sessions, k), range(1, num_chapters)
+                )
+            )
+
+        for chapter, session, bridge in zip(self.chapters, sessions, bridges):
+            self.paragraph_list.append(chapter["title"])
+            if bridge:
+                self.paragraph_list.append(bridge)
+            self.paragraph_list.extend(session.paragraph_list)
+
+        last = sessions[-1]
+        self.writing_memory = last.writing_memory
+        self.writing_plan = last.writing_plan
+        self.temp_setting = last.temp_setting
+        self.no_memory_paragraph = last.no_memory_paragraph
+        self.memory_start = len(self.paragraph_list) - (
+            len(last.paragraph_list) - last.memory_start
+        )
+        self.recordNovel()
+        return self.chapters
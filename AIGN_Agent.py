@@ -0,0 +1,420 @@
+import threading
+import time
+from typing import Optional
+
+from agentscope.agents import AgentBase
+from agentscope.message import Msg
+
+from AIGN_Context import ContextBuilder, estimateUsage
+from AIGN_Memory import UnboundedMemory
+from AIGN_Metrics import MetricsRecorder, default_recorder
+from AIGN_Prompt import section_repair_prompt
+from AIGN_Retry import ParseError, RetryPolicy
+from uniai.utils import providerName
+
+
+# 输入字段在 prefix_stable 模式下的排序：越稳定越靠前，便于命中 provider 的前缀缓存
+INPUT_STABILITY = {
+    "用户想法": 0,
+    "大纲": 0,
+    "小说大纲": 0,
+    "用户要求": 0,
+    "润色要求": 0,
+    "前文记忆": 1,
+    "相关前文": 3,
+    "临时设定": 3,
+    "计划": 3,
+    "上文内容": 4,
+    "上文": 4,
+    "正文内容": 4,
+    "要润色的内容": 4,
+    "章节数": 0,
+    "下一章概要": 3,
+    "上一章结尾": 4,
+    "下一章开头": 4,
+}
+
+
+def orderInputs(inputs: dict) -> dict:
+    """按稳定程度重排输入字段，未知字段排在中间，同级字段保持原顺序"""
+    keys = sorted(inputs, key=lambda k: INPUT_STABILITY.get(k, 2))
+    return {k: inputs[k] for k in keys}
+
+
+def newUsage() -> dict:
+    return {
+        "model": None,
+        "queue_wait": 0.0,
+        "ttft": None,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cached_tokens": 0,
+        # 流提前结束时 provider 不会返回用量，token 数为本地估计
+        "usage_estimated": False,
+    }
+
+
+def addUsage(usage: Optional[dict], resp: dict, ttft=None):
+    """把一次 chatLLM 响应中的用量累加到 usage 中"""
+    if usage is None:
+        return
+    usage["model"] = resp.get("model") or usage["model"]
+    usage["queue_wait"] += resp.get("queue_wait") or 0.0
+    for k in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens"):
+        usage[k] += resp.get(k) or 0
+    if usage["ttft"] is None:
+        usage["ttft"] = ttft
+
+
+class MarkdownStreamParser:
+    """
+    增量解析类md格式中 # key 的内容
+    feed 接收流式输出的累计内容，只处理新出现的完整行；
+    所有 output_keys 都有内容且读到 # END 后 done 为 True，可以提前结束流
+    """
+
+    def __init__(self, output_keys: list):
+        self.output_keys = output_keys
+        self.sections = {}
+        self.current_section = ""
+        self.consumed = 0
+        self.tail = ""
+        self.end_seen = False
+
+    def feedLine(self, line: str):
+        if line.startswith("# ") or line.startswith(" # "):
+            # new key
+            self.current_section = line[2:].strip()
+            self.sections[self.current_section] = []
+            if self.current_section == "END":
+                self.end_seen = True
+        else:
+            # add content to current key
+            if self.current_section:
+                self.sections[self.current_section].append(line.strip())
+
+    def feed(self, content: str) -> bool:
+        end = content.rfind("\n")
+        if end >= self.consumed:
+            for line in content[self.consumed : end].split("\n"):
+                self.feedLine(line)
+            self.consumed = end + 1
+        self.tail = content[self.consumed :]
+        return self.done
+
+    @property
+    def done(self) -> bool:
+        if not self.end_seen:
+            return False
+        sections = self.getSections(with_tail=False)
+        return all(len(sections.get(k, "")) > 0 for k in self.output_keys)
+
+    def getSections(self, with_tail=True) -> dict:
+        """返回当前已解析的各个 section，with_tail 时包括尚未结束的最后一行"""
+        sections = {k: list(v) for k, v in self.sections.items()}
+        if with_tail and self.tail:
+            if self.tail.startswith("# ") or self.tail.startswith(" # "):
+                sections.setdefault(self.tail[2:].strip(), [])
+            elif self.current_section:
+                sections[self.current_section].append(self.tail.strip())
+        return {k: "\n".join(v).strip() for k, v in sections.items()}
+
+
+class AgentCall:
+    """
+    MarkdownAgent 一次 invoke 用到的会话相关对象，以及这次调用产生的数据
+    agent 在会话之间共享，这些都不能保存在 agent 上
+    - chatLLM、memory、stream、on_partial: 本次调用使用的 chatLLM、对话记忆和流式设置
+    - usage: 本次调用（含重试）的用量，见 newUsage
+    - context_report: 各输入字段裁剪前后的 token 数
+    - partial_sections: 流式输出时最近解析出的 section
+    - repair: 修复缺失 key 的结果，success / fail，没有修复时为 None
+    """
+
+    def __init__(self, chatLLM, memory=None, stream=False, on_partial=None):
+        self.chatLLM = chatLLM
+        self.memory = memory
+        self.stream = stream
+        self.on_partial = on_partial
+        self.usage = newUsage()
+        self.context_report = {}
+        self.partial_sections = {}
+        self.repair = None
+
+
+class MarkdownAgent(AgentBase):
+    """专门应对输入输出都是md格式的情况，例如小说生成"""
+
+    def __init__(
+        self,
+        chatLLM,
+        sys_prompt: str,
+        name: str,
+        temperature=0.8,
+        top_p=0.8,
+        use_memory=False,
+        memory=None,
+        first_replay="明白了。",
+        # first_replay=None,
+        is_speak=True,
+        retry_policy: Optional[RetryPolicy] = None,
+        stream=False,
+        on_partial=None,
+        repair=False,
+        metrics: Optional[MetricsRecorder] = None,
+        context_builder: Optional[ContextBuilder] = None,
+        prefix_stable=False,
+    ) -> None:
+        super().__init__(name=name, use_memory=False)
+
+        self.chatLLM = chatLLM
+        self.sys_prompt = sys_prompt
+        self.temperature = temperature
+        self.top_p = top_p
+        # use_memory 时用 memory 保存对话，默认不限长度，
+        # 也可以传入 AIGN_Memory 中的 SlidingWindowMemory、SummarizingMemory；
+        # 共享 agent 时每个会话用 memory.fork() 得到自己的一份，通过 AgentCall 传入
+        self.use_memory = use_memory or memory is not None
+        self.memory = memory
+        if self.use_memory and self.memory is None:
+            self.memory = UnboundedMemory()
+        self.is_speak = is_speak
+        self.retry_policy = retry_policy or RetryPolicy()
+        # stream 模式下边接收边解析，解析完成后立即关闭流；两者都只是默认值，可以按调用覆盖
+        self.stream = stream
+        self.on_partial = on_partial
+        # repair 模式下解析失败时只追问缺失的 key，而不是整段重新生成
+        # repair_stats 为所有调用的累计结果，单次调用的结果见 AgentCall.repair
+        self.repair = repair
+        self.repair_stats = {"success": 0, "fail": 0}
+        self.stats_lock = threading.Lock()
+        self.metrics = metrics or default_recorder
+        # 按 token 预算裁剪输入，每次调用的裁剪结果见 AgentCall.context_report
+        self.context_builder = context_builder
+        # 稳定的输入在前、易变的输入在后，让请求前缀尽量保持不变
+        self.prefix_stable = prefix_stable
+
+        self.prefix = [{"role": "user", "content": self.sys_prompt}]
+
+        if first_replay:
+            self.prefix.append({"role": "assistant", "content": first_replay})
+        else:
+            resp = chatLLM(messages=self.prefix)
+            self.prefix.append({"role": "assistant", "content": resp["content"]})
+            if self.is_speak:
+                self.speak(Msg(self.name, resp["content"]))
+
+    def newCall(
+        self, chatLLM=None, on_partial=None, stream=None, memory=None
+    ) -> AgentCall:
+        """参数为 None 时使用 agent 上的默认值"""
+        return AgentCall(
+            chatLLM or self.chatLLM,
+            memory=memory if memory is not None else self.memory,
+            stream=self.stream if stream is None else stream,
+            on_partial=on_partial or self.on_partial,
+        )
+
+    def query(self, user_input: str, call: AgentCall) -> dict:
+        resp = call.chatLLM(
+            messages=self.getHistory(call.memory)
+            + [{"role": "user", "content": user_input}],
+            temperature=self.temperature,
+            top_p=self.top_p,
+        )
+        addUsage(call.usage, resp)
+        self.remember(call.memory, user_input, resp["content"])
+
+        return resp
+
+    def queryStream(self, user_input: str, output_keys: list, call: AgentCall) -> dict:
+        """流式 query，output_keys 全部解析完成并读到 # END 后关闭流"""
+        start_time = time.time()
+        ttft = None
+        messages = self.getHistory(call.memory) + [
+            {"role": "user", "content": user_input}
+        ]
+        responses = call.chatLLM(
+            messages=messages,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            stream=True,
+        )
+        parser = MarkdownStreamParser(output_keys)
+        call.partial_sections = {}
+        resp = {"content": "", "total_tokens": None}
+        try:
+            for resp in responses:
+                if ttft is None and resp["content"]:
+                    ttft = time.time() - start_time
+                done = parser.feed(resp["content"])
+                call.partial_sections = parser.getSections()
+                if call.on_partial:
+                    call.on_partial(self.name, call.partial_sections)
+                if done:
+                    break
+        finally:
+            close = getattr(responses, "close", None)
+            if close:
+                close()
+        if resp.get("total_tokens") is None:
+            # 读到 # END 就关闭了流，没有收到最后带用量的一块
+            resp = {**resp, **estimateUsage(messages, resp["content"])}
+            call.usage["usage_estimated"] = True
+        addUsage(call.usage, resp, ttft)
+        self.remember(call.memory, user_input, resp["content"])
+
+        return resp
+
+    @property
+    def history(self) -> list:
+        """系统提示词和首次回复，加上 memory 中的对话"""
+        return self.getHistory(self.memory)
+
+    def getHistory(self, memory) -> list:
+        if memory is None:
+            return self.prefix
+        return self.prefix + memory.messages()
+
+    def remember(self, memory, user_input: str, output: str):
+        if memory is not None:
+            memory.add(user_input, output)
+
+    def getOutput(self, input_content: str, output_keys: list, call: AgentCall) -> dict:
+        """
+        解析类md格式中 # key 的内容，未解析全部output_keys中的key会报错
+        call.stream 或 call.on_partial 不为空时流式输出
+        """
+        if call.stream or call.on_partial:
+            resp = self.queryStream(input_content, output_keys, call)
+        else:
+            resp = self.query(input_content, call)
+        output = resp["content"]
+
+        parser = MarkdownStreamParser(output_keys)
+        parser.feed(output)
+        sections = parser.getSections()
+
+        missing = [
+            k for k in output_keys if (k not in sections) or (len(sections[k]) == 0)
+        ]
+        if missing:
+            error = ParseError(
+                f"fail to parse {missing[0]} in output:\n{output}\n\n",
+                sections=sections,
+                missing=missing,
+                output=output,
+            )
+            if not (self.repair and len(missing) < len(output_keys)):
+                raise error
+            sections = self.repairOutput(input_content, error, call)
+
+        if self.is_speak:
+            self.speak(
+                Msg(
+                    self.name,
+                    f"total_tokens: {resp['total_tokens']}\n{resp['content']}\n",
+                )
+            )
+        return sections
+
+    def countRepair(self, call: AgentCall, result: str):
+        call.repair = result
+        with self.stats_lock:
+            self.repair_stats[result] += 1
+
+    def repairOutput(
+        self, input_content: str, error: ParseError, call: AgentCall
+    ) -> dict:
+        """追加一轮对话，只让模型补充 error.missing 中的 key，失败则抛出原来的 error"""
+        repair_input = section_repair_prompt.format(
+            missing="、".join(f"# {k}" for k in error.missing),
+            output_format="\n".join(f"# {k}\n..." for k in error.missing),
+        )
+        try:
+            resp = call.chatLLM(
+                messages=self.getHistory(call.memory)
+                + [
+                    {"role": "user", "content": input_content},
+                    {"role": "assistant", "content": error.output},
+                    {"role": "user", "content": repair_input},
+                ],
+                temperature=self.temperature,
+                top_p=self.top_p,
+            )
+        except Exception:
+            self.countRepair(call, "fail")
+            raise
+        addUsage(call.usage, resp)
+
+        parser = MarkdownStreamParser(error.missing)
+        parser.feed(resp["content"])
+        repaired = parser.getSections()
+        if any(len(repaired.get(k, "")) == 0 for k in error.missing):
+            self.countRepair(call, "fail")
+            raise error
+
+        self.countRepair(call, "success")
+        sections = dict(error.sections)
+        for k in error.missing:
+            sections[k] = repaired[k]
+        return sections
+
+    def invoke(
+        self,
+        inputs: dict,
+        output_keys: list,
+        chatLLM=None,
+        on_partial=None,
+        call: Optional[AgentCall] = None,
+    ) -> dict:
+        """
+        chatLLM 不为 None 时本次调用用它代替 self.chatLLM
+        on_partial(name, sections) 不为 None 时本次调用流式输出，每收到一块调用一次
+        call 不为 None 时忽略 chatLLM 和 on_partial，本次调用的数据写入 call
+        """
+        if call is None:
+            call = self.newCall(chatLLM, on_partial)
+        # RouterChatLLM 等可以按 agent 路由的 chatLLM
+        forAgent = getattr(call.chatLLM, "forAgent", None)
+        if forAgent is not None:
+            call.chatLLM = forAgent(self.name)
+        context_tokens = None
+        if self.context_builder is not None:
+            inputs, call.context_report = self.context_builder.build(inputs)
+            context_tokens = {k: v["tokens"] for k, v in call.context_report.items()}
+
+        if self.prefix_stable:
+            inputs = orderInputs(inputs)
+
+        input_content = ""
+        for k, v in inputs.items():
+            if isinstance(v, str) and len(v) > 0:
+                input_content += f"# {k}\n{v}\n\n"
+
+        provider = providerName(call.chatLLM)
+        getOutput = self.retry_policy.wrap(self.getOutput, provider=provider)
+        start_time = time.time()
+        success = False
+        try:
+            result = getOutput(input_content, output_keys, call)
+            success = True
+        finally:
+            self.metrics.record(
+                {
+                    "agent": self.name,
+                    "provider": provider,
+                    "latency": time.time() - start_time,
+                    "retries": getOutput.retries,
+                    "success": success,
+                    "context_tokens": context_tokens,
+                    **call.usage,
+                }
+            )
+
+        return result
+
+    def clear_memory(self):
+        if self.memory is not None:
+            self.memory.clear()
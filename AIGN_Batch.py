@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from AIGN import AIGN
+from AIGN_Context import estimateUsage
+from uniai.utils import forwardRouting
+
+
+def makeCountingChatLLM(chatLLM, counter):
+    """
+    包装 chatLLM，把每次调用的 total_tokens 累加到 counter 中（线程安全）
+    流式调用按最后一块的用量计数，流被提前关闭、没有用量时按本地估计计数
+    """
+    lock = threading.Lock()
+
+    def count(messages, resp):
+        tokens = resp.get("total_tokens") if resp else None
+        if tokens is None and resp:
+            tokens = estimateUsage(messages, resp.get("content") or "")["total_tokens"]
+        with lock:
+            counter["calls"] += 1
+            counter["tokens"] += tokens or 0
+
+    def wrap(chatLLM):
+        def countingChatLLM(messages, *args, **kwargs):
+            resp = chatLLM(messages, *args, **kwargs)
+            if isinstance(resp, dict):
+                count(messages, resp)
+                return resp
+
+            def respGenerator():
+                last = None
+                try:
+                    for last in resp:
+                        yield last
+                finally:
+                    close = getattr(resp, "close", None)
+                    if close:
+                        close()
+                    count(messages, last)
+
+            return respGenerator()
+
+        return forwardRouting(countingChatLLM, chatLLM, wrap)
+
+    return wrap(chatLLM)
+
+
+class NovelBatchRunner:
+    """
+    多部小说并发生成。每部小说仍按 大纲->开头->下一段 顺序推进，
+    但不同小说的步骤在同一个有界线程池中交错执行，一部小说等待网络时其他小说继续推进。
+    """
+
+    def __init__(self, chatLLM, max_workers=8, journal_dir=None, aign_options=None):
+        self.max_workers = max_workers
+        # 不为 None 时每部小说在 journal_dir 下有自己的检查点日志，已有的日志会被恢复
+        self.journal_dir = journal_dir
+        # 创建 AIGN 时的其他参数，例如 pipeline、num_drafts
+        self.aign_options = aign_options or {}
+        self.counter = {"calls": 0, "tokens": 0}
+        self.chatLLM = makeCountingChatLLM(chatLLM, self.counter)
+
+        self.aigns = []
+        self.errors = {}
+        self.paragraph_count = 0
+        self.start_time = None
+        self.end_time = None
+
+    def nextStep(self, aign, target_length, target_paragraphs=None):
+        if not aign.novel_outline:
+            return aign.genNovelOutline
+        if not aign.paragraph_list:
+            return aign.genBeginning
+        if target_paragraphs is not None:
+            if len(aign.paragraph_list) >= target_paragraphs:
+                return None
+        if target_length is not None and len(aign.novel_text) >= target_length:
+            return None
+        return aign.genNextParagraph
+
+    def run(
+        self,
+        ideas,
+        target_length,
+        user_requriments="",
+        embellishment_idea="",
+        target_paragraphs=None,
+        on_step=None,
+    ):
+        """
+        生成 ideas 中每个想法对应的小说，直到正文长度达到 target_length 或段落数达到 target_paragraphs
+        ideas 的元素可以是想法字符串，也可以是 (想法, 写作要求) 元组
+        on_step(i, aign) 在第 i 部小说每完成一步后调用
+        """
+        self.aigns = []
+        for i, idea in enumerate(ideas):
+            if self.journal_dir:
+                journal_path = os.path.join(self.journal_dir, f"novel_{i}.jsonl")
+                aign = AIGN.resume(self.chatLLM, journal_path, **self.aign_options)
+            else:
+                aign = AIGN(self.chatLLM, **self.aign_options)
+            # 从日志恢复的小说沿用日志中的想法和要求
+            if not aign.user_idea:
+                if isinstance(idea, tuple):
+                    aign.user_idea, aign.user_requriments = idea
+                else:
+                    aign.user_idea = idea
+                    aign.user_requriments = user_requriments
+                aign.embellishment_idea = embellishment_idea
+            self.aigns.append(aign)
+
+        self.start_time = time.time()
+        ready = deque(range(len(self.aigns)))
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while ready or running:
+                while ready and len(running) < self.max_workers:
+                    i = ready.popleft()
+                    step = self.nextStep(
+                        self.aigns[i], target_length, target_paragraphs
+                    )
+                    if step is None:
+                        continue
+                    running[executor.submit(step)] = (i, step.__name__)
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, step_name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self.errors[i] = e
+                        print(
+                            "-" * 30
+                            + f"\n小说 {i} 在 {step_name} 失败：\n{e}\n"
+                            + "-" * 30
+                        )
+                        continue
+                    if step_name != "genNovelOutline":
+                        self.paragraph_count += 1
+                    if on_step is not None:
+                        on_step(i, self.aigns[i])
+                    ready.append(i)
+        self.end_time = time.time()
+
+        return self.aigns
+
+    def stats(self) -> dict:
+        elapsed = (self.end_time or time.time()) - self.start_time
+        return {
+            "novels": len(self.aigns),
+            "failed": len(self.errors),
+            "elapsed": elapsed,
+            "llm_calls": self.counter["calls"],
+            "paragraphs": self.paragraph_count,
+            "paragraphs_per_min": self.paragraph_count / elapsed * 60,
+            "total_tokens": self.counter["tokens"],
+            "tokens_per_s": self.counter["tokens"] / elapsed,
+            "total_chars": sum(len(aign.novel_text) for aign in self.aigns),
+        }
+
+
+if __name__ == "__main__":
+    from ideas import idea_list
+    from LLM import chatLLM
+
+    requriments_list = ["", "主角独自一人行动。非常重要！主角不要有朋友！！！"]
+    ideas = [(idea, req) for idea in idea_list for req in requriments_list]
+
+    runner = NovelBatchRunner(chatLLM, max_workers=8)
+    runner.run(ideas, target_length=10000)
+    print(runner.stats())
@@ -0,0 +1,154 @@
+import re
+
+_encoding = None
+_encoding_loaded = False
+
+_cjk_pattern = re.compile(r"[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]")
+
+
+def getEncoding():
+    """tiktoken 的 cl100k_base 编码，没有安装 tiktoken 时为 None"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def tokensEstimated() -> bool:
+    """countTokens 是否只能按字数估算（没有可用的 tiktoken）"""
+    return getEncoding() is None
+
+
+def countTokens(text: str) -> int:
+    """本地计算 token 数，装了 tiktoken 时精确计算，否则按中文约 0.6 token/字估算"""
+    if not text:
+        return 0
+    encoding = getEncoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_cjk_pattern.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) / 3.5) + 1
+
+
+def estimateUsage(messages: list, content: str) -> dict:
+    """provider 没有返回用量时（例如提前关闭的流），本地估计的用量"""
+    prompt_tokens = sum(countTokens(m.get("content") or "") for m in messages)
+    completion_tokens = countTokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def trimToTokens(text: str, max_tokens: int, keep="head", count_tokens=countTokens):
+    """把 text 截断到 max_tokens 以内，keep 为 head 保留开头，为 tail 保留结尾"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    def piece(n):
+        return text[:n] if keep == "head" else text[len(text) - n :]
+
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(piece(mid)) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    result = piece(lo)
+
+    # 尽量在换行处截断，避免留下半句话
+    if keep == "head":
+        cut = result.rfind("\n")
+        if cut > len(result) // 2:
+            result = result[:cut]
+    else:
+        cut = result.find("\n")
+        if 0 <= cut < len(result) // 2:
+            result = result[cut + 1 :]
+    return result
+
+
+class ContextBuilder:
+    """
+    按 token 预算组装 MarkdownAgent 的输入
+    - priorities: 可裁剪的字段及其优先级，数字越小越先被裁剪；不在其中的字段不会被裁剪
+    - keep_tail: 裁剪时保留结尾的字段，例如 上文内容
+    - summarizer: 可选，summarizer(key, text, max_tokens) -> str，先尝试摘要，不满足预算再截断
+    build 返回裁剪后的 inputs 和每个字段的 token 报告，
+    report["total"]["estimated"] 为 True 时 token 数是按字数估算的（没有安装 tiktoken）
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        priorities: dict,
+        keep_tail=("上文内容", "上文"),
+        min_tokens=64,
+        summarizer=None,
+        count_tokens=countTokens,
+    ):
+        self.budget = budget
+        self.priorities = priorities
+        self.keep_tail = set(keep_tail)
+        self.min_tokens = min_tokens
+        self.summarizer = summarizer
+        self.count_tokens = count_tokens
+
+    def build(self, inputs: dict):
+        inputs = dict(inputs)
+        tokens = {
+            k: self.count_tokens(v) if isinstance(v, str) else 0
+            for k, v in inputs.items()
+        }
+        report = {
+            k: {"tokens": n, "original_tokens": n, "action": "kept"}
+            for k, n in tokens.items()
+        }
+
+        overflow = sum(tokens.values()) - self.budget
+        trimmable = sorted(
+            (k for k in inputs if k in self.priorities and tokens[k] > 0),
+            key=lambda k: self.priorities[k],
+        )
+        for k in trimmable:
+            if overflow <= 0:
+                break
+            target = max(self.min_tokens, tokens[k] - overflow)
+            if target >= tokens[k]:
+                continue
+
+            text = inputs[k]
+            action = "trimmed"
+            if self.summarizer is not None:
+                summary = self.summarizer(k, text, target)
+                if summary and self.count_tokens(summary) <= target:
+                    text = summary
+                    action = "summarized"
+            if action == "trimmed":
+                keep = "tail" if k in self.keep_tail else "head"
+                text = trimToTokens(text, target, keep, self.count_tokens)
+
+            inputs[k] = text
+            new_tokens = self.count_tokens(text)
+            overflow -= tokens[k] - new_tokens
+            tokens[k] = new_tokens
+            report[k]["tokens"] = new_tokens
+            report[k]["action"] = action
+
+        report["total"] = {
+            "tokens": sum(tokens.values()),
+            "budget": self.budget,
+            "over_budget": max(0, overflow),
+            "estimated": self.count_tokens is countTokens and tokensEstimated(),
+        }
+        return inputs, report
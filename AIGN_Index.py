@@ -0,0 +1,130 @@
+import math
+import re
+from array import array
+from collections import Counter
+
+_non_word = re.compile(r"[\s\W_]")
+_sentence_end = re.compile(r"(?<=[。！？!?…\n])")
+
+
+class ParagraphIndex:
+    """
+    正文段落的本地倒排索引，BM25 打分，词项为字 n-gram，不依赖外部服务
+    段落被切成约 passage_length 字的片段作为检索单位，支持增量添加
+    查询时只使用 idf 最高的 max_query_grams 个 n-gram，并跳过过于常见的 n-gram，
+    保证上万段的小说也能在毫秒级完成查询
+    """
+
+    def __init__(
+        self,
+        n=2,
+        passage_length=300,
+        k1=1.2,
+        b=0.75,
+        max_query_grams=24,
+        max_df_ratio=0.05,
+    ):
+        self.n = n
+        self.passage_length = passage_length
+        self.k1 = k1
+        self.b = b
+        self.max_query_grams = max_query_grams
+        self.max_df_ratio = max_df_ratio
+
+        self.passages = []  # (段落下标, 片段文本)
+        self.doc_lengths = array("i")
+        self.total_length = 0
+        self.postings = {}  # n-gram -> (doc ids, 词频)
+        self.indexed_count = 0
+
+    def grams(self, text: str) -> list:
+        n = self.n
+        grams = [text[i : i + n] for i in range(len(text) - n + 1)]
+        return [gram for gram in grams if not _non_word.search(gram)]
+
+    def splitPassages(self, text: str) -> list:
+        passages = []
+        current = ""
+        for sentence in _sentence_end.split(text):
+            if current and len(current) + len(sentence) > self.passage_length:
+                passages.append(current.strip())
+                current = ""
+            current += sentence
+        if current.strip():
+            passages.append(current.strip())
+        return passages
+
+    def addParagraph(self, paragraph_index: int, text: str):
+        for passage in self.splitPassages(text):
+            doc_id = len(self.passages)
+            self.passages.append((paragraph_index, passage))
+            counts = Counter(self.grams(passage))
+            length = sum(counts.values())
+            self.doc_lengths.append(length)
+            self.total_length += length
+            for gram, tf in counts.items():
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = (array("i"), array("i"))
+                posting[0].append(doc_id)
+                posting[1].append(tf)
+
+    def sync(self, paragraph_list: list):
+        """索引 paragraph_list 中尚未索引的段落"""
+        if len(paragraph_list) < self.indexed_count:
+            self.__init__(
+                self.n,
+                self.passage_length,
+                self.k1,
+                self.b,
+                self.max_query_grams,
+                self.max_df_ratio,
+            )
+        for i in range(self.indexed_count, len(paragraph_list)):
+            self.addParagraph(i, paragraph_list[i])
+        self.indexed_count = len(paragraph_list)
+
+    def search(self, query: str, top_k=8, before=None) -> list:
+        """返回 [(score, doc_id)]，before 不为 None 时只检索下标小于 before 的段落"""
+        num_docs = len(self.passages)
+        if num_docs == 0:
+            return []
+        max_df = max(256, int(num_docs * self.max_df_ratio))
+        query_grams = []
+        for gram in set(self.grams(query)):
+            posting = self.postings.get(gram)
+            if posting is None or len(posting[0]) > max_df:
+                continue
+            df = len(posting[0])
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            query_grams.append((idf, gram))
+        query_grams.sort(reverse=True)
+
+        avg_length = self.total_length / num_docs
+        k1, b = self.k1, self.b
+        doc_lengths = self.doc_lengths
+        scores = {}
+        for idf, gram in query_grams[: self.max_query_grams]:
+            doc_ids, tfs = self.postings[gram]
+            for doc_id, tf in zip(doc_ids, tfs):
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (
+                    tf + norm
+                )
+
+        if before is not None:
+            scores = {d: s for d, s in scores.items() if self.passages[d][0] < before}
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(score, doc_id) for doc_id, score in best[:top_k]]
+
+    def retrieve(self, query: str, max_length=800, before=None) -> str:
+        """检索与 query 最相关的片段，按原文顺序拼接，总长度不超过 max_length"""
+        selected = []
+        length = 0
+        for _, doc_id in self.search(query, top_k=16, before=before):
+            passage = self.passages[doc_id][1]
+            if length + len(passage) > max_length:
+                continue
+            selected.append(doc_id)
+            length += len(passage)
+        return "\n……\n".join(self.passages[d][1] for d in sorted(selected))
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+
+
+class NovelJournal:
+    """
+    每部小说一个只追加的 jsonl 日志
+    - snapshot 记录：完整状态
+    - update 记录：变化的字段，以及新增的段落
+    每次追加都会 flush 到操作系统，fsync 按条数或时间批量进行；
+    记录数超过 compact_every 后，用一条 snapshot 原子地替换整个文件
+    """
+
+    def __init__(self, path, fsync_every=8, fsync_interval=5.0, compact_every=256):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self.lock = threading.Lock()
+        self.file = None
+        self.records = 0
+        self.unsynced = 0
+        self.last_fsync = time.time()
+
+    def __getstate__(self):
+        # 文件句柄不能被复制，复制出的对象在下次写入时重新打开
+        state = self.__dict__.copy()
+        state["file"] = None
+        state["lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def open(self):
+        if self.file is None:
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+        return self.file
+
+    def append(self, record: dict):
+        with self.lock:
+            f = self.open()
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            self.records += 1
+            self.unsynced += 1
+            if (
+                self.unsynced >= self.fsync_every
+                or time.time() - self.last_fsync >= self.fsync_interval
+            ):
+                self.sync()
+
+    def sync(self):
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_fsync = time.time()
+
+    def needCompact(self) -> bool:
+        return self.records >= self.compact_every
+
+    def compact(self, state: dict):
+        """用一条 snapshot 记录原子地替换日志"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                record = {"type": "snapshot", "state": state}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.records = 1
+            self.unsynced = 0
+            self.last_fsync = time.time()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.sync()
+                self.file.close()
+                self.file = None
+
+    def load(self) -> dict:
+        """重放日志得到最新状态，日志不存在时返回空 dict"""
+        state = {}
+        if not os.path.exists(self.path):
+            return state
+        records = 0
+        offset = 0
+        torn = False
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    record = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    torn = True
+                    break
+                offset += len(line)
+                records += 1
+                if record["type"] == "snapshot":
+                    state = record["state"]
+                    state["paragraph_list"] = list(state.get("paragraph_list", []))
+                elif record["type"] == "update":
+                    state.update(record.get("fields", {}))
+                    paragraphs = record.get("paragraphs", [])
+                    state.setdefault("paragraph_list", []).extend(paragraphs)
+        if torn:
+            # 截掉写了一半的记录，之后的追加才能从新的一行开始
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self.records = records
+        return state
@@ -0,0 +1,178 @@
+import copy
+import threading
+
+from AIGN_Context import countTokens, trimToTokens
+from AIGN_Prompt import conversation_summary_prompt
+
+
+def turnMessages(turns: list) -> list:
+    messages = []
+    for user_input, output in turns:
+        messages.append({"role": "user", "content": user_input})
+        messages.append({"role": "assistant", "content": output})
+    return messages
+
+
+class UnboundedMemory:
+    """保留全部对话轮次，等价于原来的 use_memory=True"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turns = []  # [(用户输入, 模型输出)]
+
+    def add(self, user_input: str, output: str):
+        with self.lock:
+            self.appendTurn(user_input, output)
+            evicted = self.compact()
+        if evicted:
+            self.evict(evicted)
+
+    def appendTurn(self, user_input: str, output: str):
+        self.turns.append((user_input, output))
+
+    def compact(self) -> list:
+        """持有 self.lock 时调用，返回被丢弃的轮次"""
+        return []
+
+    def evict(self, turns: list):
+        """在 self.lock 之外调用，处理被丢弃的轮次"""
+        pass
+
+    def messages(self) -> list:
+        with self.lock:
+            return turnMessages(self.turns)
+
+    def clear(self):
+        with self.lock:
+            self.turns = []
+
+    def tokens(self) -> int:
+        with self.lock:
+            return sum(countTokens(u) + countTokens(o) for u, o in self.turns)
+
+    def fork(self):
+        """同样配置、没有对话内容的 memory，共享 agent 时每个会话一份"""
+        new = copy.copy(self)
+        new.lock = threading.Lock()
+        new.clear()
+        return new
+
+
+class SlidingWindowMemory(UnboundedMemory):
+    """
+    滑动窗口：对话总 token 数超过 max_tokens 时从最早的轮次开始丢弃
+    至少保留最近 min_turns 轮，即使它们本身已经超出预算
+    """
+
+    def __init__(self, max_tokens=4000, min_turns=1):
+        super().__init__()
+        self.max_tokens = max_tokens
+        self.min_turns = min_turns
+        self.turn_tokens = []
+
+    def appendTurn(self, user_input: str, output: str):
+        self.turns.append((user_input, output))
+        self.turn_tokens.append(countTokens(user_input) + countTokens(output))
+
+    def compact(self) -> list:
+        evicted = []
+        while (
+            len(self.turns) > self.min_turns
+            and sum(self.turn_tokens) > self.max_tokens
+        ):
+            evicted.append(self.turns.pop(0))
+            self.turn_tokens.pop(0)
+        return evicted
+
+    def clear(self):
+        with self.lock:
+            self.turns = []
+            self.turn_tokens = []
+
+    def tokens(self) -> int:
+        with self.lock:
+            return sum(self.turn_tokens)
+
+
+class SummarizingMemory(SlidingWindowMemory):
+    """
+    在滑动窗口的基础上，把被丢弃的轮次总结成一轮放在最前面
+    summarizer(summary, text, max_tokens) -> str，根据旧的摘要和被丢弃的对话生成新的摘要
+    摘要最多 summary_tokens 个 token，计入 max_tokens
+    总结在锁外进行，不会阻塞 messages()；总结完成之前，被丢弃的轮次仍原样出现在 messages() 中
+    """
+
+    def __init__(self, summarizer, max_tokens=4000, summary_tokens=500, min_turns=1):
+        super().__init__(max_tokens - summary_tokens, min_turns)
+        self.summarizer = summarizer
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self.summarizing = []  # 已被丢弃、还没有合并进摘要的轮次
+        # 同一时间只有一个总结，保证新摘要总是基于上一个摘要
+        self.summary_lock = threading.Lock()
+
+    def compact(self) -> list:
+        evicted = super().compact()
+        self.summarizing.extend(evicted)
+        return evicted
+
+    def evict(self, turns: list):
+        with self.summary_lock:
+            with self.lock:
+                queue = self.summarizing
+                pending = list(queue)
+                summary = self.summary
+            # 之前的总结可能已经一并处理了这些轮次
+            if not pending:
+                return
+            text = "\n\n".join(f"用户：{u}\n回复：{o}" for u, o in pending)
+            summary = self.summarizer(summary, text, self.summary_tokens)
+            with self.lock:
+                # 总结期间被 clear 过时丢弃结果
+                if self.summarizing is queue:
+                    self.summary = trimToTokens(summary or "", self.summary_tokens)
+                    del queue[: len(pending)]
+
+    def messages(self) -> list:
+        with self.lock:
+            messages = turnMessages(self.summarizing + self.turns)
+            if self.summary:
+                messages = [
+                    {"role": "user", "content": f"之前对话的摘要：\n{self.summary}"},
+                    {"role": "assistant", "content": "明白了。"},
+                ] + messages
+            return messages
+
+    def clear(self):
+        with self.lock:
+            self.turns = []
+            self.turn_tokens = []
+            self.summary = ""
+            self.summarizing = []
+
+    def fork(self):
+        new = super().fork()
+        new.summary_lock = threading.Lock()
+        return new
+
+
+def llmSummarizer(chatLLM, prompt=conversation_summary_prompt):
+    """
+    用 chatLLM 生成摘要的 summarizer，prompt 需要包含 {summary}、{text}、{max_tokens}
+    """
+
+    def summarizer(summary, text, max_tokens):
+        resp = chatLLM(
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt.format(
+                        summary=summary or "无", text=text, max_tokens=max_tokens
+                    ),
+                }
+            ],
+            temperature=0.3,
+        )
+        return resp["content"].strip()
+
+    return summarizer
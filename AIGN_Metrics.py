@@ -0,0 +1,186 @@
+import json
+import threading
+import time
+
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+TOKEN_KEYS = ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens")
+
+
+class JsonlExporter:
+    """每次 MarkdownAgent 调用结束后追加一行 json"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class MetricsRecorder:
+    """
+    收集 MarkdownAgent 每次调用的指标，并按 (agent, provider, model) 聚合
+    exporters 中的对象需要实现 export(record)，每条记录都会推送给它们
+    """
+
+    def __init__(self, exporters=None):
+        self.exporters = list(exporters or [])
+        self.lock = threading.Lock()
+        self.groups = {}
+
+    def __deepcopy__(self, memo):
+        # 进程内共享，gr.State 复制 AIGN 时不复制记录器
+        return self
+
+    def addExporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def record(self, record: dict):
+        record.setdefault("time", time.time())
+        key = (record["agent"], record["provider"], record.get("model") or "")
+        with self.lock:
+            group = self.groups.setdefault(
+                key,
+                {
+                    "calls": 0,
+                    "failures": 0,
+                    "retries": 0,
+                    "latency_sum": 0.0,
+                    "latency_buckets": [0] * len(LATENCY_BUCKETS),
+                    "ttft_sum": 0.0,
+                    "ttft_count": 0,
+                    "queue_wait_sum": 0.0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                    "cached_tokens": 0,
+                },
+            )
+            group["calls"] += 1
+            group["failures"] += 0 if record.get("success", True) else 1
+            group["retries"] += record.get("retries", 0)
+            group["latency_sum"] += record["latency"]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if record["latency"] <= bound:
+                    group["latency_buckets"][i] += 1
+            if record.get("ttft") is not None:
+                group["ttft_sum"] += record["ttft"]
+                group["ttft_count"] += 1
+            group["queue_wait_sum"] += record.get("queue_wait") or 0.0
+            for k in TOKEN_KEYS:
+                group[k] += record.get(k) or 0
+
+        for exporter in self.exporters:
+            exporter.export(record)
+
+    def aggregates(self) -> list:
+        with self.lock:
+            result = []
+            for (agent, provider, model), group in self.groups.items():
+                calls = group["calls"]
+                result.append(
+                    {
+                        "agent": agent,
+                        "provider": provider,
+                        "model": model,
+                        "calls": calls,
+                        "failures": group["failures"],
+                        "retries": group["retries"],
+                        "avg_latency": group["latency_sum"] / calls,
+                        "avg_ttft": (
+                            group["ttft_sum"] / group["ttft_count"]
+                            if group["ttft_count"]
+                            else None
+                        ),
+                        "avg_queue_wait": group["queue_wait_sum"] / calls,
+                        "prompt_tokens": group["prompt_tokens"],
+                        "completion_tokens": group["completion_tokens"],
+                        "total_tokens": group["total_tokens"],
+                        "cached_tokens": group["cached_tokens"],
+                        "cache_hit_rate": (
+                            group["cached_tokens"] / group["prompt_tokens"]
+                            if group["prompt_tokens"]
+                            else 0.0
+                        ),
+                    }
+                )
+            return result
+
+    def writeJsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for aggregate in self.aggregates():
+                f.write(json.dumps(aggregate, ensure_ascii=False) + "\n")
+
+    def toPrometheus(self) -> str:
+        """以 Prometheus 文本格式导出聚合指标"""
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            groups = [
+                (k, dict(v, latency_buckets=list(v["latency_buckets"])))
+                for k, v in self.groups.items()
+            ]
+
+        def labels(key, extra=""):
+            agent, provider, model = key
+            text = f'agent="{agent}",provider="{provider}",model="{model}"'
+            return "{" + text + extra + "}"
+
+        metric("aign_agent_calls_total", "counter", "MarkdownAgent invocations")
+        for key, group in groups:
+            lines.append(f"aign_agent_calls_total{labels(key)} {group['calls']}")
+        metric("aign_agent_failures_total", "counter", "Invocations that raised")
+        for key, group in groups:
+            lines.append(f"aign_agent_failures_total{labels(key)} {group['failures']}")
+        metric("aign_agent_retries_total", "counter", "Retries inside invocations")
+        for key, group in groups:
+            lines.append(f"aign_agent_retries_total{labels(key)} {group['retries']}")
+
+        metric("aign_agent_latency_seconds", "histogram", "Invocation latency")
+        for key, group in groups:
+            bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+            counts = group["latency_buckets"] + [group["calls"]]
+            for bound, count in zip(bounds, counts):
+                le = f',le="{bound}"'
+                lines.append(
+                    f"aign_agent_latency_seconds_bucket{labels(key, le)} {count}"
+                )
+            lines.append(
+                f"aign_agent_latency_seconds_sum{labels(key)} {group['latency_sum']}"
+            )
+            lines.append(
+                f"aign_agent_latency_seconds_count{labels(key)} {group['calls']}"
+            )
+
+        metric("aign_agent_ttft_seconds", "summary", "Time to first token")
+        for key, group in groups:
+            lines.append(
+                f"aign_agent_ttft_seconds_sum{labels(key)} {group['ttft_sum']}"
+            )
+            lines.append(
+                f"aign_agent_ttft_seconds_count{labels(key)} {group['ttft_count']}"
+            )
+        metric("aign_agent_queue_wait_seconds_total", "counter", "Client-side wait")
+        for key, group in groups:
+            queue_wait = group["queue_wait_sum"]
+            lines.append(f"aign_agent_queue_wait_seconds_total{labels(key)} {queue_wait}")
+        for k in TOKEN_KEYS:
+            metric(f"aign_agent_{k}_total", "counter", k.replace("_", " "))
+            for key, group in groups:
+                lines.append(f"aign_agent_{k}_total{labels(key)} {group[k]}")
+
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.toPrometheus())
+
+
+default_recorder = MetricsRecorder()
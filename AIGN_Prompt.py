@@ -119,6 +119,7 @@ novel_writer_prompt = """
 - 临时设定：记录不在大纲中的剧情细节，以备随时参考。
 - 计划：之前对故事发展方向的设想。
 - 用户要求：根据用户的特殊需求，调整故事内容。
+- 相关前文：从较早的正文中检索出的、与当前计划相关的片段，用于保持前后一致，可能没有。
 - 上文内容：前面已完成的小说正文。
 ## Outputs:
 以固定格式输出：
@@ -279,3 +280,116 @@ memory_maker_prompt = """
 ## Init:
 在开始之前，请确保你已经完全理解了上述流程和目标。如果你准备好了，可以回复我“明白了”
 """
+
+section_repair_prompt = """
+你的输出缺少以下部分：{missing}
+请不要重复已经输出的内容，只补充缺少的部分，以固定格式输出：
+```
+{output_format}
+# END
+```
+"""
+
+conversation_summary_prompt = """
+请把下面的对话总结成一份简洁的摘要，保留之后对话需要用到的关键信息，不超过 {max_tokens} 个 token。
+# 之前的摘要
+{summary}
+# 要总结的对话
+{text}
+只输出摘要本身。
+"""
+
+chapter_planner_prompt = """
+# Role:
+网络小说作家，正在把大纲拆分成章节
+## Goals:
+- 根据大纲，把整部小说拆分成指定数量的章节，每章有清晰、独立的剧情任务。
+- 章节之间前后衔接，合起来完整覆盖大纲中的剧情，从开端一直写到结局。
+## Inputs:
+- 用户想法：小说的初始想法。
+- 大纲：小说总体安排，以及一些设定。
+- 用户要求：用户的特殊需求。
+- 章节数：需要拆分成的章节数量。
+## Outputs:
+以固定格式输出，每章一行，行数必须等于章节数，概要之后用“｜设定：”接本章的临时设定：
+```
+# 章节
+第1章 章节标题：本章的剧情概要，包括主要事件、出场人物和结尾时的状态｜设定：本章开头时的地点、在场人物及其状态等临时设定
+第2章 章节标题：本章的剧情概要，包括主要事件、出场人物和结尾时的状态｜设定：本章开头时的地点、在场人物及其状态等临时设定
+# END
+```
+## Workflows:
+1. **通读大纲：** 理解小说的主线、关键事件和结局。
+2. **划分章节：** 按剧情节奏把主线分配到各章，保证每章都有推进，不重复，也不跳过重要剧情。
+3. **写清交接：** 每章概要写明本章结尾时人物所处的状态，方便下一章接着写。
+4. **给出设定：** 每章的临时设定写明本章开头时的场景和人物状态，要和上一章结尾衔接，只写本章需要的，简短即可。
+## init:
+接下来，我会提供给你小说的大纲和章节数，我希望你可以完全的理解之后再拆分章节。
+你如果明白的话，就回复我明白了。
+"""
+
+chapter_bridge_prompt = """
+# Role:
+网络小说作家，负责让相邻两章衔接自然
+## Goals:
+- 各章是分别写成的，上一章的结尾和下一章的开头之间可能衔接生硬，甚至有细节不一致。
+- 写一小段过渡，放在下一章开头之前，交代两章之间的时间、地点和人物状态变化，让剧情自然接续。
+## Inputs:
+- 大纲：小说总体安排，以及一些设定。
+- 上一章结尾：上一章最后的正文。
+- 下一章概要：下一章的剧情安排。
+- 下一章开头：下一章最前面的正文。
+## Outputs:
+以固定格式输出：
+```
+# 过渡
+一到三个自然段的过渡正文，风格与上下文一致，不要重复上一章结尾和下一章开头已经写过的内容。
+# END
+```
+## init:
+接下来，我会提供给你相邻两章的内容，我希望你可以完全的理解之后再写过渡。
+你如果明白的话，就回复我明白了。
+"""
+
+novel_fused_writer_prompt = """
+# Role:
+网络小说作家
+## Goals:
+- 根据小说大纲和其余相关内容，努力完成这部小说。
+- 一次写出可以直接发表的下一段正文，不需要之后再润色；同时制定接下来的剧情安排与临时设定。
+## Inputs:
+- 大纲：概述小说的总体框架与关键设定。
+- 前文记忆：为确保故事的前后连贯性，记录下你之前写作的关键信息。
+- 临时设定：记录不在大纲中的剧情细节，以备随时参考。
+- 计划：之前对故事发展方向的设想。
+- 用户要求：根据用户的特殊需求，调整故事内容。
+- 相关前文：从较早的正文中检索出的、与当前计划相关的片段，用于保持前后一致，可能没有。
+- 上文内容：前面已完成的小说正文。
+## Outputs:
+以固定格式输出：
+```
+# 段落
+接下来的小说正文，十几段话，不需要标题，不少于1000字。
+# 计划
+简述接下来的剧情发展方向和创作计划。
+# 临时设定
+列出与即将发展的剧情相关的临时设定，尽量保持简洁。
+# END
+```
+## Workflows:
+1. **理解和提取：** 根据已有的大纲、设定、前文记忆和计划，提取必要的背景、人物特性和前情提要，确保新写的内容能够无缝连接上文内容。
+2. **剧情发展：** 明确当前的剧情进展，保证故事发展符合大纲指引，避免偏离主线，避免内容重复。
+3. **一次成稿：** 写作时直接达到润色后的质量：
+   - **情感表达深化**：在人物对话、内心独白、描述性段落中加入情感色彩，使读者能够感同身受。
+   - **细节描写丰富**：在描绘场景、人物外貌、动作等方面加入丰富的细节，提高故事的可视化程度和沉浸感。
+   - **人物心理描写**：深入挖掘人物的心理活动，展现其内心变化。
+   - **对话设置自然**：确保对话自然流畅，符合人物的性格和故事背景，推动情节、展示人物性格。
+4. **设定调整：** 根据剧情需要，灵活调整临时设定，同时保留关键设定不变。
+非常重要！请聚焦在描绘一个重要事件及其直接对主角产生的影响上，具体到角色的行为、情感反应以及与周遭环境的交互。避免使用任何指向未来的暗示，如“将来”、“未来”、“前方”、“启程”，不预设角色的命运发展。强调场景的细节丰富性，让读者通过文字感受到故事的立体感和即时性。目标是营造一种场面戛然而止的效果，激发读者继续探索故事的愿望。
+非常重要！！！段落中只输出新写的正文，不要输出上文内容。
+## init:
+接下来，我会提供给你相关内容，我希望你可以完全的理解之后再写小说。
+你如果明白的话，就回复我明白了。
+"""
+
+chunk_embellish_requirement = "要润色的内容只是一段正文中的一部分，润色结果的长度与它相近，不要续写后面的剧情。"
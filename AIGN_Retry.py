@@ -0,0 +1,264 @@
+import random
+import re
+import threading
+import time
+
+
+class ParseError(ValueError):
+    """模型输出无法解析出所需的 # key"""
+
+    def __init__(self, message, sections=None, missing=None, output=""):
+        super().__init__(message)
+        self.sections = sections or {}
+        self.missing = missing or []
+        self.output = output
+
+
+class CircuitOpenError(RuntimeError):
+    """provider 的熔断器处于打开状态"""
+
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+PARSE = "parse"
+FATAL = "fatal"
+
+
+def getStatusCode(e):
+    status_code = getattr(e, "status_code", None)
+    if status_code is None:
+        response = getattr(e, "response", None)
+        status_code = getattr(response, "status_code", None)
+    if status_code is None:
+        # aliChatLLM 把错误信息拼进了 ValueError
+        m = re.search(r"Status code: (\d+)", str(e))
+        if m:
+            status_code = int(m.group(1))
+    return status_code
+
+
+def getRetryAfter(e):
+    """读取 Retry-After 响应头（秒），没有则返回 None"""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def classifyError(e) -> str:
+    """把异常分为 rate_limit / transient / parse / fatal 四类"""
+    if isinstance(e, ParseError):
+        return PARSE
+    status_code = getStatusCode(e)
+    if status_code == 429:
+        return RATE_LIMIT
+    if status_code in (400, 401, 403, 404, 422):
+        return FATAL
+    name = type(e).__name__
+    if "RateLimit" in name:
+        return RATE_LIMIT
+    if "Authentication" in name or "PermissionDenied" in name:
+        return FATAL
+    # 超时、连接错误、5xx 以及其他未知错误都按瞬时错误处理
+    return TRANSIENT
+
+
+class ProviderGuard:
+    """
+    每个 provider 一份的重试预算和熔断器
+    - 重试预算：每个请求存入 budget_ratio 个重试令牌，每秒至少补充 min_retries_per_sec 个，重试消耗 1 个
+    - 熔断器：连续 failure_threshold 次限流/瞬时错误后打开 cooldown 秒，之后放行一个试探请求；
+      试探请求有结果之前其他请求继续等待，试探超过 probe_timeout 秒没有结果时再放行一个
+    """
+
+    def __init__(
+        self,
+        budget_ratio=0.2,
+        min_retries_per_sec=0.5,
+        max_budget=20.0,
+        failure_threshold=8,
+        cooldown=30.0,
+        probe_timeout=120.0,
+    ):
+        self.budget_ratio = budget_ratio
+        self.min_retries_per_sec = min_retries_per_sec
+        self.max_budget = max_budget
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+
+        self.lock = threading.Lock()
+        self.budget = max_budget
+        self.last_refill = time.monotonic()
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.half_open = False
+        self.probe_start = 0.0
+
+    def refill(self):
+        now = time.monotonic()
+        self.budget = min(
+            self.max_budget,
+            self.budget + (now - self.last_refill) * self.min_retries_per_sec,
+        )
+        self.last_refill = now
+
+    def onRequest(self):
+        with self.lock:
+            self.refill()
+            self.budget = min(self.max_budget, self.budget + self.budget_ratio)
+
+    def tryRetry(self) -> bool:
+        with self.lock:
+            self.refill()
+            if self.budget < 1:
+                return False
+            self.budget -= 1
+            return True
+
+    def waitTime(self) -> float:
+        """熔断器打开时需要等待的秒数，0 表示可以发请求"""
+        with self.lock:
+            now = time.monotonic()
+            remaining = self.open_until - now
+            if remaining > 0:
+                return remaining
+            if not self.open_until:
+                return 0.0
+            if not self.half_open or now - self.probe_start > self.probe_timeout:
+                # 冷却结束，放行一个试探请求
+                self.half_open = True
+                self.probe_start = now
+                return 0.0
+            # 试探请求还没有结果
+            return min(1.0, self.cooldown)
+
+    def onSuccess(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self.half_open = False
+
+    def onFailure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.half_open or self.consecutive_failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown
+                self.half_open = False
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def getProviderGuard(provider) -> ProviderGuard:
+    """进程内每个 provider 共享一个 ProviderGuard"""
+    with _guards_lock:
+        if provider not in _guards:
+            _guards[provider] = ProviderGuard()
+        return _guards[provider]
+
+
+class RetryPolicy:
+    """
+    重试策略
+    - 限流和瞬时错误：指数退避加全抖动，限流时优先遵守 Retry-After
+    - 解析错误：不退避，立即重试，最多 max_parse_attempts 次
+    - fatal 错误：直接抛出
+    - deadline：单次调用（含所有重试）的最长秒数
+    - 所有重试都受 provider 的重试预算和熔断器约束
+    """
+
+    def __init__(
+        self,
+        max_attempts=10,
+        base_delay=1.0,
+        max_delay=60.0,
+        rate_limit_delay=5.0,
+        max_parse_attempts=4,
+        deadline=None,
+        provider=None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_delay = rate_limit_delay
+        self.max_parse_attempts = max_parse_attempts
+        self.deadline = deadline
+        self.provider = provider
+
+    def backoff(self, error_class, attempt, e):
+        base = self.rate_limit_delay if error_class == RATE_LIMIT else self.base_delay
+        delay = random.uniform(0, min(self.max_delay, base * 2**attempt))
+        if error_class == RATE_LIMIT:
+            retry_after = getRetryAfter(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        return delay
+
+    def wrap(self, func, provider=None):
+        guard = getProviderGuard(self.provider or provider or "default")
+
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            deadline = start + self.deadline if self.deadline else None
+            parse_attempts = 0
+            last_error = None
+            wrapper.retries = 0
+            for attempt in range(self.max_attempts):
+                # 熔断器半开时只有试探请求能通过，其余请求醒来后要重新检查
+                while True:
+                    wait_time = guard.waitTime()
+                    if wait_time <= 0:
+                        break
+                    if deadline and time.monotonic() + wait_time > deadline:
+                        raise CircuitOpenError(
+                            f"circuit open for {self.provider or provider}"
+                        ) from last_error
+                    time.sleep(wait_time)
+
+                if attempt == 0:
+                    guard.onRequest()
+                try:
+                    result = func(*args, **kwargs)
+                    guard.onSuccess()
+                    return result
+                except Exception as e:
+                    last_error = e
+                    error_class = classifyError(e)
+                    print("-" * 30 + f"\n失败（{error_class}）：\n{e}\n" + "-" * 30)
+
+                    if error_class == FATAL:
+                        # provider 给出了回应，不算熔断器的失败，也让等待试探结果的请求继续
+                        guard.onSuccess()
+                        raise
+                    if error_class == PARSE:
+                        guard.onSuccess()
+                        parse_attempts += 1
+                        if parse_attempts >= self.max_parse_attempts:
+                            raise
+                        delay = 0.0
+                    else:
+                        guard.onFailure()
+                        delay = self.backoff(error_class, attempt, e)
+
+                    if attempt + 1 >= self.max_attempts:
+                        raise
+                    if deadline and time.monotonic() + delay > deadline:
+                        raise
+                    if not guard.tryRetry():
+                        raise
+                    wrapper.retries += 1
+                    time.sleep(delay)
+            raise last_error
+
+        wrapper.retries = 0
+        return wrapper
+
+    def call(self, func, *args, **kwargs):
+        return self.wrap(func)(*args, **kwargs)
@@ -0,0 +1,60 @@
+import re
+
+_punctuation = re.compile(r"[\s\W_]+")
+
+
+def charNgrams(text: str, n: int) -> list:
+    return [text[i : i + n] for i in range(len(text) - n + 1)]
+
+
+def repetitionRatio(text: str, n=4) -> float:
+    """重复的字 n-gram 所占比例，0 表示没有重复"""
+    grams = charNgrams(_punctuation.sub("", text), n)
+    if not grams:
+        return 0.0
+    return 1 - len(set(grams)) / len(grams)
+
+
+def overlapRatio(text: str, context: str, n=8) -> float:
+    """text 中与 context 重复的字 n-gram 所占比例，用于发现照抄上文"""
+    grams = charNgrams(_punctuation.sub("", text), n)
+    if not grams or not context:
+        return 0.0
+    context_grams = set(charNgrams(_punctuation.sub("", context), n))
+    return sum(gram in context_grams for gram in grams) / len(grams)
+
+
+def planCoverage(text: str, plan: str) -> float:
+    """计划中的字二元组在 text 中出现的比例"""
+    plan_grams = set(charNgrams(_punctuation.sub("", plan), 2))
+    if not plan_grams:
+        return 1.0
+    text_grams = set(charNgrams(_punctuation.sub("", text), 2))
+    return len(plan_grams & text_grams) / len(plan_grams)
+
+
+def scoreDraft(draft: dict, plan="", context="", target_length=1500) -> dict:
+    """
+    本地快速给写作草稿打分，不调用模型
+    综合长度、内部重复、照抄上文和计划覆盖率，score 越高越好
+    """
+    paragraph = draft.get("段落", "")
+    length = min(1.0, len(paragraph) / target_length)
+    repetition = repetitionRatio(paragraph)
+    overlap = overlapRatio(paragraph, context)
+    coverage = planCoverage(paragraph, plan)
+    score = 0.35 * length + 0.35 * (1 - repetition) + 0.3 * coverage - overlap
+    return {
+        "score": score,
+        "length": len(paragraph),
+        "repetition": repetition,
+        "overlap": overlap,
+        "coverage": coverage,
+    }
+
+
+def selectDraft(drafts: list, plan="", context="", target_length=1500):
+    """返回得分最高的草稿及所有草稿的得分"""
+    scores = [scoreDraft(d, plan, context, target_length) for d in drafts]
+    best = max(range(len(drafts)), key=lambda i: scores[i]["score"])
+    return drafts[best], scores
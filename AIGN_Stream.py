@@ -0,0 +1,101 @@
+import re
+import threading
+
+# 句子结尾，允许后面跟着引号、括号，以及换行等空白（归入前一块）
+_sentence_end = re.compile(r"[。！？!?…\n][”’」』\"')）]*\s*")
+
+
+class StreamingPolisher:
+    """
+    接收写作者流式输出的段落，每攒够 chunk_chars 字的完整句子就切成一块，
+    交给 polish(context, text) 在 executor 中并发处理，结果按块的顺序拼接
+    - feed(text): 段落的累计文本；与已提交的文本对不上时（例如重试后重新生成）丢弃之前的块
+    - finish(text): 写作结束，提交剩余文本，等待所有块完成并返回拼接结果
+    - on_polished(text): 每块结果按顺序可用时调用，原文在这一块之后换行时结果末尾带 \n，
+      依次拼接即为目前润色好的段落
+    - on_reset(): 写作者重新生成、之前通过 on_polished 发出的块作废时调用
+    context 为该块之前、尚未润色的段落文本
+    块在句子中间切开时直接拼接，在换行处切开时用换行拼接，不会增加原文没有的换行
+    """
+
+    def __init__(
+        self, polish, executor, chunk_chars=800, on_polished=None, on_reset=None
+    ):
+        self.polish = polish
+        self.executor = executor
+        self.chunk_chars = chunk_chars
+        self.on_polished = on_polished
+        self.on_reset = on_reset
+
+        # 完成回调可能在提交的线程中同步执行，所以用可重入锁
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.futures = []
+        self.separators = []  # 每块之后的分隔符，\n 或空串
+        self.dispatched = ""
+        self.emitted = 0
+
+    def reset(self):
+        for future in self.futures:
+            future.cancel()
+        emitted = self.emitted
+        self.generation += 1
+        self.futures = []
+        self.separators = []
+        self.dispatched = ""
+        self.emitted = 0
+        if emitted and self.on_reset is not None:
+            self.on_reset()
+
+    def cut(self, pending: str) -> int:
+        """pending 中第 chunk_chars 字之后第一个句子结尾的位置，没有则返回 0"""
+        for m in _sentence_end.finditer(pending, self.chunk_chars):
+            # 结尾在末尾时，后面可能还有引号没有收到
+            if m.end() < len(pending):
+                return m.end()
+        return 0
+
+    def submit(self, text: str):
+        future = self.executor.submit(self.polish, self.dispatched, text)
+        generation = self.generation
+        self.futures.append(future)
+        self.separators.append("\n" if "\n" in text[len(text.rstrip()) :] else "")
+        self.dispatched += text
+        future.add_done_callback(lambda _: self.emit(generation))
+
+    def feed(self, text: str):
+        with self.lock:
+            if not text.startswith(self.dispatched):
+                self.reset()
+            while True:
+                pending = text[len(self.dispatched) :]
+                end = self.cut(pending)
+                if not end:
+                    break
+                self.submit(pending[:end])
+
+    def emit(self, generation):
+        if self.on_polished is None:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            while self.emitted < len(self.futures):
+                future = self.futures[self.emitted]
+                if not future.done() or future.cancelled() or future.exception():
+                    break
+                separator = self.separators[self.emitted]
+                self.emitted += 1
+                self.on_polished(future.result().strip() + separator)
+
+    def finish(self, text: str) -> str:
+        with self.lock:
+            if not text.startswith(self.dispatched):
+                self.reset()
+            rest = text[len(self.dispatched) :]
+            if rest.strip():
+                self.submit(rest)
+            chunks = list(zip(self.futures, self.separators))
+        return "".join(
+            future.result().strip() + separator for future, separator in chunks
+        ).strip()
@@ -0,0 +1,70 @@
+from itertools import chain
+
+
+class NovelText:
+    """
+    按段落存储的小说正文
+    - append 为 O(1)
+    - tail 只访问末尾几段
+    - 全文在被读取时才拼接，并缓存下来，之后只拼接新增的段落
+    paragraphs 可以直接 append，新增的段落会在下次读取时被发现
+    """
+
+    def __init__(self, paragraphs=None):
+        self.paragraphs = list(paragraphs or [])
+        self.cache = ""
+        self.cached_count = 0
+        self.length = 0
+        self.counted = 0
+
+    def append(self, paragraph: str):
+        self.paragraphs.append(paragraph)
+
+    def reset(self):
+        self.cache = ""
+        self.cached_count = 0
+        self.length = 0
+        self.counted = 0
+
+    def __len__(self) -> int:
+        """全文的字符数，不需要拼接全文"""
+        if self.counted > len(self.paragraphs):
+            self.reset()
+        for paragraph in self.paragraphs[self.counted :]:
+            self.length += len(paragraph) + 2
+        self.counted = len(self.paragraphs)
+        return self.length
+
+    @property
+    def text(self) -> str:
+        if self.cached_count > len(self.paragraphs):
+            self.reset()
+        if self.cached_count < len(self.paragraphs):
+            new_paragraphs = self.paragraphs[self.cached_count :]
+            self.cache += "".join(f"{paragraph}\n\n" for paragraph in new_paragraphs)
+            self.cached_count = len(self.paragraphs)
+        return self.cache
+
+    def __str__(self) -> str:
+        return self.text
+
+    def tail(self, max_length=2000, extra=()) -> str:
+        """末尾若干段，总长度不超过 max_length，extra 为接在正文后面、尚未提交的段落"""
+        last_paragraph = ""
+        for paragraph in chain(reversed(extra), reversed(self.paragraphs)):
+            if (len(last_paragraph) + len(paragraph)) < max_length:
+                last_paragraph = paragraph + "\n" + last_paragraph
+            else:
+                break
+        return last_paragraph
+
+    def tailStart(self, max_length=2000, extra=()) -> int:
+        """tail 中第一段在 paragraphs 中的下标"""
+        length = 0
+        for extra_paragraph in reversed(extra):
+            length += len(extra_paragraph) + 1
+        start = len(self.paragraphs)
+        while start > 0 and length + len(self.paragraphs[start - 1]) < max_length:
+            length += len(self.paragraphs[start - 1]) + 1
+            start -= 1
+        return start
@@ -1,7 +1,22 @@
-from uniai import aliChatLLM, deepseekChatLLM, zhipuChatLLM
+from uniai import deepseekChatLLM
 
 chatLLM = deepseekChatLLM()
 
+# 按 provider 的额度在客户端限流，进程内所有 AIGN 共享，例如
+# from uniai import limitedChatLLM
+# chatLLM = limitedChatLLM(deepseekChatLLM(), rpm=60, tpm=200000, max_in_flight=8)
+
+# 有多个 provider 时，可以按延迟和错误率路由并自动故障转移，例如
+# from uniai import RouterChatLLM, aliChatLLM, zhipuChatLLM
+# chatLLM = RouterChatLLM(
+#     {
+#         "deepseek": deepseekChatLLM(),
+#         "ali": aliChatLLM("qwen-max"),
+#         "zhipu": zhipuChatLLM("glm-4"),
+#     },
+#     routes={"MemoryMaker": ["deepseek", "zhipu"]},
+# )
+
 if __name__ == "__main__":
 
     content = "请用一个成语介绍你自己"
@@ -1,66 +1,154 @@
-import random
+import os
+import queue
 import threading
 import time
+import uuid
 
 import gradio as gr
 
 from AIGN import AIGN
+from AIGN_Journal import NovelJournal
 from LLM import chatLLM
 
-STREAM_INTERVAL = 0.2
+# 两次推送之间的最短间隔，这段时间内的多次更新合并为一次
+MIN_UPDATE_INTERVAL = 0.1
+DONE = object()
+# 每个会话的检查点日志 <会话 id>.jsonl 和导出的 <会话 id>.md 所在目录
+OUTPUT_DIR = "app_output"
+
 
 def make_middle_chat():
     carrier = threading.Event()
     carrier.history = []
+    # middle_chat 每产生一块新内容就放入一个事件
+    carrier.events = queue.Queue()
 
-    def middle_chat(messages, temperature=None, top_p=None):
+    def middle_chat(messages, temperature=None, top_p=None, stream=False):
+        """
+        stream 为 True 时返回生成器，MarkdownAgent 读到 # END 后关闭它，
+        关闭时同时关闭 chatLLM 的流，不再读剩下的内容
+        """
         nonlocal carrier
         carrier.history.append([None, ""])
         if len(carrier.history) > 20:
             carrier.history = carrier.history[-16:]
-        try:
-            for resp in chatLLM(
+        carrier.events.put(True)
+
+        def respGenerator():
+            responses = chatLLM(
                 messages, temperature=temperature, top_p=top_p, stream=True
-            ):
-                output_text = resp["content"]
-                total_tokens = resp["total_tokens"]
-
-                carrier.history[-1][1] = f"total_tokens: {total_tokens}\n{output_text}"
-            return {
-                "content": output_text,
-                "total_tokens": total_tokens,
-            }
-        except Exception as e:
-            carrier.history[-1][1] = f"Error: {e}"
-            raise e
+            )
+            try:
+                for resp in responses:
+                    total_tokens = resp.get("total_tokens")
+                    carrier.history[-1][1] = (
+                        f"total_tokens: {total_tokens}\n{resp['content']}"
+                    )
+                    carrier.events.put(True)
+                    yield resp
+            except Exception as e:
+                carrier.history[-1][1] = f"Error: {e}"
+                carrier.events.put(True)
+                raise e
+            finally:
+                close = getattr(responses, "close", None)
+                if close:
+                    close()
+
+        if stream:
+            return respGenerator()
+
+        resp = None
+        for resp in respGenerator():
+            pass
+        return resp
 
     return carrier, middle_chat
 
 
+def start_session(aign):
+    """
+    会话第一次生成时分配会话 id，之后的每次生成都追加到它的检查点日志，
+    可以用 AIGN.resume 从日志恢复
+    """
+    if aign.journal is None:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        session_id = uuid.uuid4().hex[:12]
+        aign.journal = NovelJournal(os.path.join(OUTPUT_DIR, f"{session_id}.jsonl"))
+
+
+def run_and_export(aign, gen):
+    """生成结束后把可读的正文导出到日志旁边的 .md"""
+
+    def target():
+        gen()
+        aign.exportNovel(os.path.splitext(aign.journal.path)[0] + ".md")
+
+    return target
+
+
+def stream_updates(carrier, target, get_outputs):
+    """
+    在线程中运行 target，只在 middle_chat 产生新内容时推送，
+    短时间内的多次更新合并为一次，没有变化的输出用 gr.update() 跳过
+    """
+
+    def run():
+        try:
+            target()
+        finally:
+            carrier.events.put(DONE)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    last_outputs = None
+    last_update = 0.0
+    done = False
+    while not done:
+        done = carrier.events.get() is DONE
+        wait = last_update + MIN_UPDATE_INTERVAL - time.time()
+        if not done and wait > 0:
+            time.sleep(wait)
+        while not done:
+            try:
+                done = carrier.events.get_nowait() is DONE
+            except queue.Empty:
+                break
+
+        outputs = get_outputs()
+        # Chatbot 的 history 会被原地修改，比较时需要拷贝
+        outputs[1] = [list(message) for message in outputs[1]]
+        if last_outputs is None:
+            yield outputs
+        elif outputs != last_outputs:
+            yield [
+                new if i == 0 or new != old else gr.update()
+                for i, (new, old) in enumerate(zip(outputs, last_outputs))
+            ]
+        last_outputs = outputs
+        last_update = time.time()
+
+
 def gen_ouline_button_clicked(aign, user_idea, history):
     aign.user_idea = user_idea
+    start_session(aign)
 
     carrier, middle_chat = make_middle_chat()
     carrier.history = history
     aign.novel_outline_writer.chatLLM = middle_chat
 
-    gen_ouline_thread = threading.Thread(target=aign.genNovelOutline)
-    gen_ouline_thread.start()
-
-    while gen_ouline_thread.is_alive():
-        yield [
+    hide_button = gr.Button(visible=False)
+    yield from stream_updates(
+        carrier,
+        run_and_export(aign, aign.genNovelOutline),
+        lambda: [
             aign,
             carrier.history,
             aign.novel_outline,
-            gr.Button(visible=False),
-        ]
-        time.sleep(STREAM_INTERVAL)
-    yield [
-        aign,
-        carrier.history,
-        aign.novel_outline,
-        gr.Button(visible=False),
-    ]
+            hide_button,
+        ],
+    )
 
 
 def gen_beginning_button_clicked(
@@ -69,33 +157,26 @@ def gen_beginning_button_clicked(
     aign.novel_outline = novel_outline
     aign.user_requriments = user_requriments
     aign.embellishment_idea = embellishment_idea
+    start_session(aign)
 
     carrier, middle_chat = make_middle_chat()
     carrier.history = history
     aign.novel_beginning_writer.chatLLM = middle_chat
     aign.novel_embellisher.chatLLM = middle_chat
 
-    gen_beginning_thread = threading.Thread(target=aign.genBeginning)
-    gen_beginning_thread.start()
-
-    while gen_beginning_thread.is_alive():
-        yield [
+    hide_button = gr.Button(visible=False)
+    yield from stream_updates(
+        carrier,
+        run_and_export(aign, aign.genBeginning),
+        lambda: [
             aign,
             carrier.history,
             aign.writing_plan,
             aign.temp_setting,
             aign.novel_content,
-            gr.Button(visible=False),
-        ]
-        time.sleep(STREAM_INTERVAL)
-    yield [
-        aign,
-        carrier.history,
-        aign.writing_plan,
-        aign.temp_setting,
-        aign.novel_content,
-        gr.Button(visible=False),
-    ]
+            hide_button,
+        ],
+    )
 
 
 def gen_next_paragraph_button_clicked(
@@ -116,36 +197,49 @@ def gen_next_paragraph_button_clicked(
     aign.writing_plan = writing_plan
     aign.user_requriments = user_requriments
     aign.embellishment_idea = embellishment_idea
+    start_session(aign)
 
     carrier, middle_chat = make_middle_chat()
     carrier.history = history
     aign.novel_writer.chatLLM = middle_chat
+    aign.novel_fused_writer.chatLLM = middle_chat
     aign.novel_embellisher.chatLLM = middle_chat
     aign.memory_maker.chatLLM = middle_chat
 
-    gen_next_paragraph_thread = threading.Thread(target=aign.genNextParagraph)
-    gen_next_paragraph_thread.start()
+    # 润色好的块先接在正文后面显示，写作者重试时清空，段落提交后改为显示正文
+    polished = []
+    num_paragraphs = len(aign.paragraph_list)
+
+    def on_polished(text):
+        polished.append(text)
+        carrier.events.put(True)
+
+    def on_reset():
+        polished.clear()
+        carrier.events.put(True)
+
+    def novel_content():
+        if len(aign.paragraph_list) > num_paragraphs:
+            return aign.novel_content
+        return aign.novel_content + "".join(polished)
 
-    while gen_next_paragraph_thread.is_alive():
-        yield [
+    yield from stream_updates(
+        carrier,
+        run_and_export(
+            aign,
+            lambda: aign.genNextParagraphStreaming(
+                on_polished=on_polished, on_reset=on_reset
+            ),
+        ),
+        lambda: [
             aign,
             carrier.history,
             aign.writing_plan,
             aign.temp_setting,
             aign.writing_memory,
-            aign.novel_content,
-            gr.Button(visible=False),
-        ]
-        time.sleep(STREAM_INTERVAL)
-    yield [
-        aign,
-        carrier.history,
-        aign.writing_plan,
-        aign.temp_setting,
-        aign.writing_memory,
-        aign.novel_content,
-        gr.Button(visible=False),
-    ]
+            novel_content(),
+        ],
+    )
 
 
 css = """
@@ -167,7 +261,7 @@ css = """
 """
 
 with gr.Blocks(css=css) as demo:
-    aign = gr.State(AIGN(chatLLM))
+    aign = gr.State(AIGN(chatLLM, stream=True))
     gr.Markdown("## AI 写小说 Demo")
     with gr.Row():
         with gr.Column(scale=0, elem_id="row1"):
@@ -273,5 +367,6 @@ with gr.Blocks(css=css) as demo:
     )
 
 
-demo.queue()
-demo.launch()
+if __name__ == "__main__":
+    demo.queue()
+    demo.launch()
@@ -0,0 +1,45 @@
+"""
+写作+润色两步与合并为一步的对比：用 fakeChatLLM 各写 N 段，统计每段的 token 和延迟
+在仓库根目录运行：python -m benchmarks.bench_fused [段落数]
+"""
+
+import sys
+import time
+
+from AIGN import AIGN
+from AIGN_Batch import makeCountingChatLLM
+from uniai import fakeChatLLM
+
+NUM_PARAGRAPHS = 10
+FAKE_OPTIONS = {"latency": 0.2, "tokens_per_s": 2000}
+
+
+def bench(fused, num_paragraphs):
+    counter = {"calls": 0, "tokens": 0}
+    aign = AIGN(makeCountingChatLLM(fakeChatLLM(**FAKE_OPTIONS), counter), fused=fused)
+    aign.genNovelOutline("一个普通人意外获得了预知未来的能力")
+    aign.genBeginning()
+
+    counter["calls"] = counter["tokens"] = 0
+    start_time = time.perf_counter()
+    for _ in range(num_paragraphs):
+        aign.genNextParagraph()
+    elapsed = time.perf_counter() - start_time
+
+    name = "合并一步" if fused else "写作+润色"
+    print(
+        f"{name:<8} 调用 {counter['calls'] / num_paragraphs:.1f} 次/段, "
+        f"{counter['tokens'] / num_paragraphs:.0f} token/段, "
+        f"{elapsed / num_paragraphs:.3f} s/段"
+    )
+
+
+def main():
+    num_paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_PARAGRAPHS
+    print(f"fakeChatLLM {FAKE_OPTIONS}, {num_paragraphs} 段")
+    bench(False, num_paragraphs)
+    bench(True, num_paragraphs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+启动耗时的基准测试：用 python -X importtime 分别导入各个入口模块，
+输出总耗时和自身耗时最多的模块
+在仓库根目录运行：python -m benchmarks.bench_import [模块名 ...]
+"""
+
+import os
+import subprocess
+import sys
+
+MODULES = ["uniai", "AIGN", "AIGN_Batch", "LLM", "app"]
+TOP_N = 8
+
+
+def importTime(module: str):
+    """返回 (总耗时 us, [(自身耗时 us, 模块名)])，导入失败时返回错误信息"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    entries = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        entries.append((int(self_us), name.strip()))
+        if name.strip() == module:
+            total = int(cumulative_us)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    entries.sort(reverse=True)
+    return total, entries[:TOP_N]
+
+
+def main():
+    for module in sys.argv[1:] or MODULES:
+        total, entries = importTime(module)
+        if total is None:
+            print(f"{module}: 导入失败 {entries}\n")
+            continue
+        print(f"{module}: {total / 1000:.1f} ms")
+        for self_us, name in entries:
+            print(f"    {self_us / 1000:8.1f} ms  {name}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
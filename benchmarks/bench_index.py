@@ -0,0 +1,53 @@
+"""
+ParagraphIndex 的基准测试：逐段索引 1 万段（约 2000 字/段）合成正文，统计索引和查询耗时
+在仓库根目录运行：python -m benchmarks.bench_index
+"""
+
+import random
+import time
+
+from AIGN_Index import ParagraphIndex
+
+NUM_PARAGRAPHS = 10000
+PARAGRAPH_LENGTH = 2000
+VOCAB_SIZE = 3000
+
+
+def makeParagraph(rng, vocab, weights):
+    chars = rng.choices(vocab, weights=weights, k=PARAGRAPH_LENGTH)
+    for i in range(30, PARAGRAPH_LENGTH, 30):
+        chars[i] = "。"
+    return "".join(chars)
+
+
+def main():
+    rng = random.Random(0)
+    vocab = [chr(0x4E00 + i) for i in range(VOCAB_SIZE)]
+    # 近似汉字的 Zipf 分布
+    weights = [1 / (rank + 1) for rank in range(VOCAB_SIZE)]
+
+    index = ParagraphIndex()
+    paragraph_list = []
+    add_times = []
+    query_times = []
+    for i in range(NUM_PARAGRAPHS):
+        paragraph_list.append(makeParagraph(rng, vocab, weights))
+        start = time.perf_counter()
+        index.sync(paragraph_list)
+        add_times.append(time.perf_counter() - start)
+
+        if (i + 1) % 1000 == 0:
+            query = makeParagraph(rng, vocab, weights)[:120]
+            start = time.perf_counter()
+            index.retrieve(query, max_length=800, before=len(paragraph_list) - 1)
+            query_times.append(time.perf_counter() - start)
+            recent = add_times[-1000:]
+            print(
+                f"paragraphs={i + 1:>6} passages={len(index.passages):>6} "
+                f"add={sum(recent) / len(recent) * 1000:.2f}ms "
+                f"query={query_times[-1] * 1000:.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
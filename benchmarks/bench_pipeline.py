@@ -0,0 +1,162 @@
+"""
+端到端基准测试：用 fakeChatLLM 代替真实模型，统计各阶段的延迟和吞吐
+- AIGN: genNovelOutline、genBeginning、N 次 genNextParagraph
+- Gradio: app.py 中三个按钮的处理函数（需要安装 gradio）
+在仓库根目录运行：python -m benchmarks.bench_pipeline [段落数]
+"""
+
+import statistics
+import sys
+import time
+import types
+
+from AIGN import AIGN
+from AIGN_Metrics import default_recorder
+from uniai import fakeChatLLM
+
+NUM_PARAGRAPHS = 10
+FAKE_OPTIONS = {"latency": 0.2, "tokens_per_s": 2000, "chunk_chars": 20}
+
+
+def report(name, latencies, chars=0):
+    total = sum(latencies)
+    line = (
+        f"{name:<24} n={len(latencies):<3} "
+        f"mean={statistics.mean(latencies):.3f}s "
+        f"p50={statistics.median(latencies):.3f}s "
+        f"max={max(latencies):.3f}s"
+    )
+    if chars:
+        line += f" {chars / total:.0f} 字/s"
+    print(line)
+
+
+def timed(func, *args):
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+
+def benchAIGN(num_paragraphs):
+    aign = AIGN(fakeChatLLM(**FAKE_OPTIONS))
+
+    _, outline_time = timed(aign.genNovelOutline, "一个普通人意外获得了预知未来的能力")
+    beginning, beginning_time = timed(aign.genBeginning)
+    latencies = []
+    chars = 0
+    for _ in range(num_paragraphs):
+        paragraph, latency = timed(aign.genNextParagraph)
+        latencies.append(latency)
+        chars += len(paragraph)
+
+    print("AIGN")
+    report("genNovelOutline", [outline_time])
+    report("genBeginning", [beginning_time], len(beginning))
+    report("genNextParagraph", latencies, chars)
+    # 流式写作+分块润色：第一块润色结果的延迟
+    first_latencies = []
+    latencies = []
+    for _ in range(num_paragraphs):
+        start_time = time.perf_counter()
+        first = []
+        aign.genNextParagraphStreaming(
+            on_polished=lambda text: first or first.append(
+                time.perf_counter() - start_time
+            )
+        )
+        latencies.append(time.perf_counter() - start_time)
+        first_latencies.append(first[0])
+    report("streaming 首块润色", first_latencies)
+    report("streaming 整段", latencies)
+    for stats in default_recorder.aggregates():
+        print(
+            f"    {stats['agent']:<20} calls={stats['calls']} "
+            f"avg_latency={stats['avg_latency']:.3f}s "
+            f"completion_tokens={stats['completion_tokens']}"
+        )
+
+
+def drain(generator):
+    """消费 Gradio 处理函数，返回 (首次更新延迟, 总耗时, 更新次数)"""
+    start_time = time.perf_counter()
+    first = None
+    updates = 0
+    for _ in generator:
+        updates += 1
+        if first is None:
+            first = time.perf_counter() - start_time
+    return first, time.perf_counter() - start_time, updates
+
+
+def importApp(chatLLM):
+    """
+    导入 app.py，其中的 from LLM import chatLLM 得到的是 chatLLM
+    LLM.py 导入时就会创建真实的 provider，没有 API key 时会失败
+    """
+    fake_llm = types.ModuleType("LLM")
+    fake_llm.chatLLM = chatLLM
+    real_llm = sys.modules.get("LLM")
+    sys.modules["LLM"] = fake_llm
+    try:
+        import app
+    finally:
+        if real_llm is None:
+            del sys.modules["LLM"]
+        else:
+            sys.modules["LLM"] = real_llm
+    # app 已经被导入过时，模块级的 chatLLM 可能是真实的
+    app.chatLLM = chatLLM
+    return app
+
+
+def benchGradio(num_paragraphs):
+    chatLLM = fakeChatLLM(**FAKE_OPTIONS)
+    try:
+        app = importApp(chatLLM)
+    except ImportError as e:
+        print(f"Gradio: 跳过（{e}）")
+        return
+
+    aign = AIGN(chatLLM, stream=True)
+    results = {}
+
+    results["outline"] = [drain(app.gen_ouline_button_clicked(aign, "一个普通人", []))]
+    results["beginning"] = [
+        drain(
+            app.gen_beginning_button_clicked(aign, [], aign.novel_outline, "", "")
+        )
+    ]
+    results["next_paragraph"] = [
+        drain(
+            app.gen_next_paragraph_button_clicked(
+                aign,
+                [],
+                aign.user_idea,
+                aign.novel_outline,
+                aign.writing_memory,
+                aign.temp_setting,
+                aign.writing_plan,
+                "",
+                "",
+            )
+        )
+        for _ in range(num_paragraphs)
+    ]
+
+    print("Gradio")
+    for name, runs in results.items():
+        report(f"{name} 首次更新", [r[0] for r in runs])
+        report(f"{name} 总耗时", [r[1] for r in runs])
+        print(f"    平均更新次数 {statistics.mean(r[2] for r in runs):.1f}")
+
+
+def main():
+    num_paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_PARAGRAPHS
+    print(f"fakeChatLLM {FAKE_OPTIONS}\n")
+    benchAIGN(num_paragraphs)
+    print()
+    benchGradio(num_paragraphs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+会话创建的基准测试：模拟 gradio 为 1000 个浏览器会话各复制一份 AIGN
+对比每个会话都新建一组 agent 的旧做法，统计耗时和内存
+在仓库根目录运行：python -m benchmarks.bench_session
+"""
+
+import copy
+import time
+import tracemalloc
+
+from AIGN import AIGN, CONTEXT_BUDGETS, makeAgents
+
+NUM_SESSIONS = 1000
+
+
+def chatLLM(messages, temperature=None, top_p=None, max_tokens=None, stream=False):
+    return {"content": "", "total_tokens": 0}
+
+
+def measure(name, create):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    sessions = [create() for _ in range(NUM_SESSIONS)]
+    elapsed = time.perf_counter() - start_time
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name}: {elapsed / NUM_SESSIONS * 1e6:.1f} us/会话, "
+        f"{memory / NUM_SESSIONS / 1024:.1f} KiB/会话"
+    )
+    return sessions
+
+
+def main():
+    template = AIGN(chatLLM)
+
+    measure("新建 agent（旧）", lambda: makeAgents(chatLLM, CONTEXT_BUDGETS))
+    measure("AIGN(chatLLM)", lambda: AIGN(chatLLM))
+    measure("deepcopy(AIGN)", lambda: copy.deepcopy(template))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+正文存储的基准测试：逐段追加到 100 万字，比较每段的平均耗时
+在仓库根目录运行：python -m benchmarks.bench_text
+"""
+
+import time
+
+from AIGN_Text import NovelText
+
+PARAGRAPH = "风" * 2000
+TARGET_LENGTH = 1_000_000
+REPORT_EVERY = 100
+
+
+def rebuildStep(paragraph_list):
+    """旧实现：每段都重新拼接全文"""
+    novel_content = ""
+    for paragraph in paragraph_list:
+        novel_content += f"{paragraph}\n\n"
+    return novel_content
+
+
+def main():
+    paragraph_list = []
+    novel_text = NovelText()
+
+    print(f"{'chars':>10} {'rebuild(ms)':>12} {'NovelText(ms)':>14}")
+    rebuild_time = 0.0
+    text_time = 0.0
+    steps = 0
+    while len(novel_text) < TARGET_LENGTH:
+        start = time.perf_counter()
+        paragraph_list.append(PARAGRAPH)
+        rebuildStep(paragraph_list)
+        rebuild_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        novel_text.append(PARAGRAPH)
+        novel_text.tail(2000)
+        len(novel_text)
+        text_time += time.perf_counter() - start
+
+        steps += 1
+        if steps % REPORT_EVERY == 0:
+            print(
+                f"{len(novel_text):>10} "
+                f"{rebuild_time / REPORT_EVERY * 1000:>12.3f} "
+                f"{text_time / REPORT_EVERY * 1000:>14.4f}"
+            )
+            rebuild_time = 0.0
+            text_time = 0.0
+
+    start = time.perf_counter()
+    novel_text.text
+    materialize_time = (time.perf_counter() - start) * 1000
+    print(f"materialize {len(novel_text)} chars once: {materialize_time:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
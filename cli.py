@@ -0,0 +1,150 @@
+"""
+命令行生成小说，适合无人值守的长时间运行，中断后用同样的参数重新运行即可继续
+
+python cli.py "主角独自一人在异世界冒险" --target-chars 100000 --output-dir output
+python cli.py --ideas-file ideas.txt --target-paragraphs 50 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import threading
+
+from AIGN_Batch import NovelBatchRunner
+
+
+class ParagraphSink:
+    """
+    把新写好的段落追加到正文文件，每写一段 flush 一次
+    启动时按检查点中的段落重写文件，保证与日志一致
+    """
+
+    def __init__(self, path, paragraph_list):
+        self.path = path
+        self.written = len(paragraph_list)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(f"{paragraph}\n\n" for paragraph in paragraph_list))
+
+    def flush(self, paragraph_list):
+        if len(paragraph_list) <= self.written:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for paragraph in paragraph_list[self.written :]:
+                f.write(f"{paragraph}\n\n")
+        self.written = len(paragraph_list)
+
+
+def readIdeas(args) -> list:
+    ideas = []
+    if args.idea:
+        ideas.append(args.idea)
+    if args.ideas_file:
+        with open(args.ideas_file, "r", encoding="utf-8") as f:
+            ideas.extend(line.strip() for line in f if line.strip())
+    return ideas
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="AI 网络小说生成")
+    parser.add_argument("idea", nargs="?", help="小说的想法")
+    parser.add_argument("--ideas-file", help="每行一个想法的文本文件")
+    parser.add_argument("--requirements", default="", help="写作要求")
+    parser.add_argument("--embellishment", default="", help="润色要求")
+    parser.add_argument("--target-chars", type=int, help="每部小说的目标字数")
+    parser.add_argument("--target-paragraphs", type=int, help="每部小说的目标段落数")
+    parser.add_argument("--output-dir", default="output", help="输出目录")
+    parser.add_argument("--workers", type=int, default=4, help="同时进行的步骤数")
+    parser.add_argument("--pipeline", action="store_true", help="在后台更新记忆")
+    parser.add_argument(
+        "--fused", action="store_true", help="没有润色要求时一次调用写出润色后的段落"
+    )
+    parser.add_argument(
+        "--stream", action="store_true", help="流式调用模型，读到 # END 后立即结束"
+    )
+    parser.add_argument("--num-drafts", type=int, default=1, help="每段的候选草稿数")
+    parser.add_argument(
+        "--retrieval-length", type=int, default=0, help="检索相关前文的最大字数"
+    )
+    parser.add_argument("--fake", action="store_true", help="使用假模型试运行")
+    args = parser.parse_args(argv)
+    if not args.idea and not args.ideas_file:
+        parser.error("需要 idea 或 --ideas-file")
+    if args.target_chars is None and args.target_paragraphs is None:
+        parser.error("需要 --target-chars 或 --target-paragraphs")
+    return args
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    ideas = readIdeas(args)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.fake:
+        from uniai import fakeChatLLM
+
+        chatLLM = fakeChatLLM(latency=0.05, tokens_per_s=5000)
+    else:
+        from LLM import chatLLM
+
+    runner = NovelBatchRunner(
+        chatLLM,
+        max_workers=args.workers,
+        journal_dir=args.output_dir,
+        aign_options={
+            "pipeline": args.pipeline,
+            "fused": args.fused,
+            "stream": args.stream,
+            "num_drafts": args.num_drafts,
+            "retrieval_length": args.retrieval_length,
+        },
+    )
+    sinks = {}
+    lock = threading.Lock()
+
+    def flushParagraphs(i, aign):
+        sink = sinks.get(i)
+        if sink is None:
+            path = os.path.join(args.output_dir, f"novel_{i}.txt")
+            sink = sinks[i] = ParagraphSink(path, aign.paragraph_list)
+        sink.flush(aign.paragraph_list)
+
+    def onStep(i, aign):
+        with lock:
+            flushParagraphs(i, aign)
+            print(
+                f"[小说 {i}] {len(aign.paragraph_list)} 段 {len(aign.novel_text)} 字",
+                flush=True,
+            )
+
+    try:
+        runner.run(
+            ideas,
+            target_length=args.target_chars,
+            user_requriments=args.requirements,
+            embellishment_idea=args.embellishment,
+            target_paragraphs=args.target_paragraphs,
+            on_step=onStep,
+        )
+    except KeyboardInterrupt:
+        print("已中断，重新运行同样的命令即可继续", file=sys.stderr)
+        raise
+    finally:
+        for i, aign in enumerate(runner.aigns):
+            try:
+                aign.syncMemory()
+            except Exception as e:
+                print(f"小说 {i} 更新记忆失败：{e}", file=sys.stderr)
+            with lock:
+                flushParagraphs(i, aign)
+            aign.exportNovel(os.path.join(args.output_dir, f"novel_{i}.md"))
+            if aign.journal is not None:
+                aign.journal.close()
+
+    print(runner.stats())
+    for i, e in runner.errors.items():
+        print(f"小说 {i} 失败：{e}", file=sys.stderr)
+    return 1 if runner.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
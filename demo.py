@@ -2,7 +2,8 @@ from AIGN import AIGN
 from ideas import idea_list
 from LLM import chatLLM
 
-aign = AIGN(chatLLM)
+# 中断后重新运行会从 novel_record.jsonl 继续写
+aign = AIGN.resume(chatLLM, "novel_record.jsonl")
 
 user_idea = idea_list[1]
 user_requriments = "主角独自一人行动。非常重要！主角不要有朋友！！！"
@@ -14,8 +15,12 @@ user_requriments = "主角独自一人行动。非常重要！主角不要有朋
 # - 在正文中添加表情包：😂😅😘💕😍👍
 # """
 
-aign.genNovelOutline(user_idea)
-aign.genBeginning(user_requriments)
+if not aign.novel_outline:
+    aign.genNovelOutline(user_idea)
+if not aign.paragraph_list:
+    aign.genBeginning(user_requriments)
 
 while 1:
     aign.genNextParagraph()
+    if len(aign.paragraph_list) % 10 == 0:
+        aign.exportNovel("novel_record.md")
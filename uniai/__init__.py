@@ -1,3 +1,37 @@
-from .aliAI import aliChatLLM
-from .deepseekAI import deepseekChatLLM
-from .zhipuAI import zhipuChatLLM
+import importlib
+
+# 各 provider 的 SDK 导入较慢，第一次用到时才导入对应模块
+_exports = {
+    "aliAsyncChatLLM": ".aliAI",
+    "aliChatLLM": ".aliAI",
+    "closeAsyncClients": ".asyncAI",
+    "LLMCache": ".cacheAI",
+    "cachedChatLLM": ".cacheAI",
+    "deepseekAsyncChatLLM": ".deepseekAI",
+    "deepseekChatLLM": ".deepseekAI",
+    "fakeChatLLM": ".fakeAI",
+    "serveFakeLLM": ".fakeAI",
+    "getRateLimiter": ".limitAI",
+    "limitedChatLLM": ".limitAI",
+    "limiterStats": ".limitAI",
+    "RateLimiter": ".limitAI",
+    "openaiChatLLM": ".openaiAI",
+    "RouterChatLLM": ".routerAI",
+    "zhipuAsyncChatLLM": ".zhipuAI",
+    "zhipuChatLLM": ".zhipuAI",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
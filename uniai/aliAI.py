@@ -4,6 +4,8 @@ from http import HTTPStatus
 
 import dashscope
 
+from .utils import cachedTokens
+
 
 def aliChatLLM(model_name, api_key=None):
     """
@@ -37,6 +39,10 @@ def aliChatLLM(model_name, api_key=None):
                     "content": response.output.choices[0].message.content,
                     "total_tokens": response.usage.input_tokens
                     + response.usage.output_tokens,
+                    "prompt_tokens": response.usage.input_tokens,
+                    "completion_tokens": response.usage.output_tokens,
+                    "cached_tokens": cachedTokens(response.usage),
+                    "model": model_name,
                 }
             else:
                 error_info = (
@@ -63,25 +69,48 @@ def aliChatLLM(model_name, api_key=None):
             )
 
             def respGenerator():
-                for response in responses:
-                    if response.status_code == HTTPStatus.OK:
-                        yield {
-                            "content": response.output.choices[0]["message"]["content"],
-                            "total_tokens": response.usage.input_tokens
-                            + response.usage.output_tokens,
-                        }
-                    else:
-                        error_info = (
-                            "Request id: %s, Status code: %s, error code: %s, error message: %s"
-                            % (
-                                response.request_id,
-                                response.status_code,
-                                response.code,
-                                response.message,
+                try:
+                    for response in responses:
+                        if response.status_code == HTTPStatus.OK:
+                            yield {
+                                "content": response.output.choices[0]["message"]["content"],
+                                "total_tokens": response.usage.input_tokens
+                                + response.usage.output_tokens,
+                                "prompt_tokens": response.usage.input_tokens,
+                                "completion_tokens": response.usage.output_tokens,
+                                "cached_tokens": cachedTokens(response.usage),
+                                "model": model_name,
+                            }
+                        else:
+                            error_info = (
+                                "Request id: %s, Status code: %s, error code: %s, error message: %s"
+                                % (
+                                    response.request_id,
+                                    response.status_code,
+                                    response.code,
+                                    response.message,
+                                )
                             )
-                        )
-                        raise ValueError(f"Error in response: {error_info}")
+                            raise ValueError(f"Error in response: {error_info}")
+                finally:
+                    # 提前结束迭代时关闭底层流
+                    responses.close()
 
             return respGenerator()
-        
+
     return chatLLM
+
+
+def aliAsyncChatLLM(model_name, api_key=None):
+    """
+    aliChatLLM 的异步版本，走 dashscope 的 OpenAI 兼容接口，进程内共享连接池
+    model_name 取值同 aliChatLLM
+    """
+    api_key = os.environ.get("ALI_AI_API_KEY", api_key)
+    from .asyncAI import openaiAsyncChatLLM
+
+    return openaiAsyncChatLLM(
+        model_name,
+        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+        api_key=api_key,
+    )
@@ -0,0 +1,106 @@
+import asyncio
+import weakref
+
+import httpx
+from openai import AsyncOpenAI
+
+from .utils import cachedTokens
+
+# 每个事件循环、每个 (base_url, api_key) 共享一个长连接池
+_clients = weakref.WeakKeyDictionary()
+
+
+def getAsyncClient(base_url, api_key, max_connections=256, max_keepalive=64):
+    """返回当前事件循环中 (base_url, api_key) 对应的共享 AsyncOpenAI 客户端"""
+    loop = asyncio.get_running_loop()
+    loop_clients = _clients.setdefault(loop, {})
+    key = (base_url, api_key)
+    if key not in loop_clients:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+        loop_clients[key] = AsyncOpenAI(
+            api_key=api_key, base_url=base_url, http_client=http_client
+        )
+    return loop_clients[key]
+
+
+async def closeAsyncClients():
+    """关闭当前事件循环中的所有共享客户端"""
+    loop_clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in loop_clients.values():
+        await client.close()
+
+
+def openaiAsyncChatLLM(model_name, base_url, api_key, stream_usage=True):
+    """
+    OpenAI 兼容接口的异步 chatLLM
+    - `await chatLLM(messages)` 返回 dict
+    - `await chatLLM(messages, stream=True)` 返回异步生成器
+    """
+
+    async def chatLLM(
+        messages: list,
+        temperature=None,
+        top_p=None,
+        max_tokens=None,
+        stream=False,
+    ) -> dict:
+        client = getAsyncClient(base_url, api_key)
+        if not stream:
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+            )
+            return {
+                "content": response.choices[0].message.content,
+                "total_tokens": response.usage.total_tokens,
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "cached_tokens": cachedTokens(response.usage),
+                "model": model_name,
+            }
+        else:
+            extra = {"stream_options": {"include_usage": True}} if stream_usage else {}
+            responses = await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+                stream=True,
+                **extra,
+            )
+
+            async def respGenerator():
+                content = ""
+                try:
+                    async for response in responses:
+                        if response.choices:
+                            delta = response.choices[0].delta.content
+                            content += delta or ""
+
+                        usage = response.usage
+                        yield {
+                            "content": content,
+                            "total_tokens": usage.total_tokens if usage else None,
+                            "prompt_tokens": usage.prompt_tokens if usage else None,
+                            "completion_tokens": (
+                                usage.completion_tokens if usage else None
+                            ),
+                            "cached_tokens": cachedTokens(usage),
+                            "model": model_name,
+                        }
+                finally:
+                    await responses.close()
+
+            return respGenerator()
+
+    return chatLLM
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from AIGN_Context import estimateUsage
+
+from .utils import forwardRouting
+
+USAGE_KEYS = ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens")
+
+
+class LLMCache:
+    """
+    基于内容寻址的磁盘响应缓存，按总字节数做 LRU 淘汰
+    每个条目是 cache_dir 下的一个 json 文件，文件名为请求的 sha256
+    """
+
+    def __init__(self, cache_dir=".llm_cache", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        self.entries = OrderedDict()  # key -> size，按最近使用排序
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_tokens = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        files = []
+        for sub in os.listdir(cache_dir):
+            sub_dir = os.path.join(cache_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(sub_dir, name))
+                    files.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self.path(key), "r", encoding="utf-8") as f:
+                    resp = json.load(f)
+                os.utime(self.path(key))
+            except (OSError, ValueError):
+                self.total_bytes -= self.entries.pop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_tokens += resp.get("total_tokens") or 0
+            return resp
+
+    def put(self, key, resp):
+        data = json.dumps(resp, ensure_ascii=False).encode("utf-8")
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self.path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "evictions": self.evictions,
+                "saved_tokens": self.saved_tokens,
+            }
+
+
+def cachedChatLLM(chatLLM, cache: LLMCache, model_name="", seed_policy="sample"):
+    """
+    给任意 chatLLM 加上响应缓存
+    缓存键由 (model_name, messages, temperature, top_p, max_tokens, 采样序号) 决定
+    seed_policy 取值
+    - sample: 同一请求第 n 次出现时对应第 n 个缓存条目，重试能拿到新结果，重跑能复现整个序列
+    - fixed: 同一请求永远返回同一个结果
+    命中的 resp 带 cache_hit，用量字段为 0，原本的 total_tokens 放在 saved_tokens
+    """
+    if seed_policy not in ("sample", "fixed"):
+        raise ValueError(f"unknown seed_policy: {seed_policy}")
+    # 请求的 sha256 -> 已经出现的次数，只保存摘要，不保存提示词本身
+    sample_counts = {}
+    lock = threading.Lock()
+
+    def makeKey(messages, temperature, top_p, max_tokens):
+        request = json.dumps(
+            {
+                "model": model_name,
+                "messages": messages,
+                "temperature": temperature,
+                "top_p": top_p,
+                "max_tokens": max_tokens,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        digest = hashlib.sha256(request.encode("utf-8")).hexdigest()
+        if seed_policy == "fixed":
+            return digest
+        with lock:
+            sample = sample_counts.get(digest, 0)
+            sample_counts[digest] = sample + 1
+        return hashlib.sha256(f"{request}\n{sample}".encode("utf-8")).hexdigest()
+
+    def wrap(chatLLM):
+        def wrapper(
+            messages: list,
+            temperature=None,
+            top_p=None,
+            max_tokens=None,
+            stream=False,
+        ) -> dict:
+            key = makeKey(messages, temperature, top_p, max_tokens)
+            kwargs = {"temperature": temperature, "top_p": top_p}
+            if max_tokens is not None:
+                kwargs["max_tokens"] = max_tokens
+
+            resp = cache.get(key)
+            if resp is not None:
+                # 命中不消耗 token，用量记为 0，原本的用量放在 saved_tokens
+                resp["saved_tokens"] = resp.get("total_tokens") or 0
+                resp.update({k: 0 for k in USAGE_KEYS})
+                resp["cache_hit"] = True
+                if not stream:
+                    return resp
+
+                def hitGenerator():
+                    yield resp
+
+                return hitGenerator()
+
+            if not stream:
+                resp = chatLLM(messages, **kwargs)
+                cache.put(key, resp)
+                return resp
+
+            def respGenerator():
+                # 读完的流写入缓存；提前关闭的流只有内容已经到 # END 时才写入，
+                # 这时还没有用量块，按本地估计补上
+                responses = chatLLM(messages, stream=True, **kwargs)
+                resp = None
+                finished = False
+                try:
+                    for resp in responses:
+                        yield resp
+                    finished = True
+                finally:
+                    close = getattr(responses, "close", None)
+                    if close:
+                        close()
+                    if resp is not None and (
+                        finished or "# END" in (resp.get("content") or "")
+                    ):
+                        if resp.get("total_tokens") is None:
+                            resp = {**resp, **estimateUsage(messages, resp["content"])}
+                        cache.put(key, resp)
+
+            return respGenerator()
+
+        # RouterChatLLM 的各 agent 视图共用同一个缓存和采样计数
+        return forwardRouting(wrapper, chatLLM, wrap)
+
+    return wrap(chatLLM)
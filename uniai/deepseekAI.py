@@ -2,6 +2,8 @@ import os
 
 from openai import OpenAI
 
+from .utils import cachedTokens
+
 
 def deepseekChatLLM(model_name="deepseek-chat", api_key=None):
     """
@@ -29,6 +31,10 @@ def deepseekChatLLM(model_name="deepseek-chat", api_key=None):
             return {
                 "content": response.choices[0].message.content,
                 "total_tokens": response.usage.total_tokens,
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "cached_tokens": cachedTokens(response.usage),
+                "model": model_name,
             }
         else:
             responses = client.chat.completions.create(
@@ -38,24 +44,47 @@ def deepseekChatLLM(model_name="deepseek-chat", api_key=None):
                 top_p=top_p,
                 max_tokens=max_tokens,
                 stream=True,
+                stream_options={"include_usage": True},
             )
 
             def respGenerator():
                 content = ""
-                for response in responses:
-                    delta = response.choices[0].delta.content
-                    content += delta
-
-                    # if response.usage:
-                    #     total_tokens = response.usage.total_tokens
-                    # else:
-                    total_tokens = None
+                try:
+                    for response in responses:
+                        # 开启 include_usage 后，最后一块只有 usage，没有 choices
+                        if response.choices:
+                            delta = response.choices[0].delta.content
+                            content += delta or ""
 
-                    yield {
-                        "content": content,
-                        "total_tokens": total_tokens,
-                    }
+                        usage = response.usage
+                        yield {
+                            "content": content,
+                            "total_tokens": usage.total_tokens if usage else None,
+                            "prompt_tokens": usage.prompt_tokens if usage else None,
+                            "completion_tokens": (
+                                usage.completion_tokens if usage else None
+                            ),
+                            "cached_tokens": cachedTokens(usage),
+                            "model": model_name,
+                        }
+                finally:
+                    # 提前结束迭代时关闭 HTTP 连接
+                    responses.close()
 
             return respGenerator()
 
     return chatLLM
+
+
+def deepseekAsyncChatLLM(model_name="deepseek-chat", api_key=None):
+    """
+    deepseekChatLLM 的异步版本，进程内共享连接池
+    model_name 取值
+    - deepseek-chat
+    """
+    api_key = os.environ.get("DEEPSEEK_AI_API_KEY", api_key)
+    from .asyncAI import openaiAsyncChatLLM
+
+    return openaiAsyncChatLLM(
+        model_name, base_url="https://api.deepseek.com", api_key=api_key
+    )
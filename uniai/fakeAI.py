@@ -0,0 +1,283 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_format_block = re.compile(r"```\w*\n(.*?)```", re.S)
+_format_key = re.compile(r"^ ?# (.+)$", re.M)
+
+_vocab = (
+    "天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏云腾致雨露结为霜金生丽水玉出昆冈"
+    "剑号巨阙珠称夜光他她我们你走看说想听笑哭风雪山河城门灯火夜色少年老人师父弟子江湖"
+)
+
+
+class FakeLLMError(RuntimeError):
+    """fakeChatLLM 注入的错误，status_code 与真实 provider 的错误一致"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def outputKeys(messages) -> list:
+    """从最后一个带 # END 格式说明的消息（通常是系统提示词）中取出需要输出的 key"""
+    for message in reversed(messages):
+        for block in _format_block.findall(message.get("content") or ""):
+            keys = [k.strip() for k in _format_key.findall(block)]
+            if "END" in keys:
+                return [k for k in keys if k != "END"]
+    return []
+
+
+def fakeText(rng: random.Random, length: int) -> str:
+    sentences = []
+    total = 0
+    while total < length:
+        sentence = "".join(rng.choices(_vocab, k=rng.randint(8, 30))) + "。"
+        sentences.append(sentence)
+        total += len(sentence)
+    # 每几句分一段
+    lines = ["".join(sentences[i : i + 4]) for i in range(0, len(sentences), 4)]
+    return "\n".join(lines)
+
+
+def fakeChatLLM(
+    latency=0.2,
+    tokens_per_s=50.0,
+    chunk_chars=20,
+    section_length=None,
+    failure_rate=0.0,
+    rate_limit_rate=0.0,
+    parse_failure_rate=0.0,
+    seed=0,
+):
+    """
+    不调用任何服务的 chatLLM，用于基准测试和压测
+    - 按提示词中的 ```...# END``` 格式说明输出每个 # key，同一请求总是得到同样的内容
+    - latency: 首个 token 之前的秒数；tokens_per_s: 之后的输出速度，中文按 0.6 token/字
+    - chunk_chars: 流式输出时每块的字数
+    - section_length: {key: 字数}，默认 段落 1500 字、大纲 800 字，其余 200 字
+    - failure_rate / rate_limit_rate: 按概率抛出 500 / 429 错误
+    - parse_failure_rate: 按概率漏掉最后一个 key，用于测试修复和重试
+    """
+    lengths = {"段落": 1500, "开头": 1500, "润色结果": 1500, "大纲": 800}
+    lengths.update(section_length or {})
+    failure_rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def draw() -> float:
+        with lock:
+            return failure_rng.random()
+
+    def makeContent(messages) -> str:
+        request = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(f"{seed}\n{request}".encode("utf-8")).digest()
+        rng = random.Random(digest)
+        keys = outputKeys(messages)
+        if not keys:
+            return "明白了。"
+        if parse_failure_rate and draw() < parse_failure_rate:
+            keys = keys[:-1]
+        sections = [f"# {k}\n{fakeText(rng, lengths.get(k, 200))}" for k in keys]
+        return "\n".join(sections) + "\n# END\n"
+
+    def usage(messages, content) -> dict:
+        prompt_tokens = int(sum(len(m.get("content") or "") for m in messages) * 0.6)
+        completion_tokens = int(len(content) * 0.6)
+        return {
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": 0,
+            "model": "fake",
+        }
+
+    def maybeFail():
+        if failure_rate and draw() < failure_rate:
+            raise FakeLLMError("injected server error", 500)
+        if rate_limit_rate and draw() < rate_limit_rate:
+            raise FakeLLMError("injected rate limit", 429)
+
+    def chatLLM(
+        messages: list,
+        temperature=None,
+        top_p=None,
+        max_tokens=None,
+        stream=False,
+    ) -> dict:
+        maybeFail()
+        content = makeContent(messages)
+        seconds_per_char = 0.6 / tokens_per_s if tokens_per_s else 0.0
+        if not stream:
+            time.sleep(latency + len(content) * seconds_per_char)
+            return {"content": content, **usage(messages, content)}
+
+        def respGenerator():
+            time.sleep(latency)
+            for end in range(chunk_chars, len(content) + chunk_chars, chunk_chars):
+                time.sleep(chunk_chars * seconds_per_char)
+                yield {
+                    "content": content[:end],
+                    "total_tokens": None,
+                    "prompt_tokens": None,
+                    "completion_tokens": None,
+                    "cached_tokens": None,
+                    "model": "fake",
+                }
+            yield {"content": content, **usage(messages, content)}
+
+        return respGenerator()
+
+    chatLLM.provider = "fakeChatLLM"
+    return chatLLM
+
+
+def makeHandler(chatLLM):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        """OpenAI 兼容的 /v1/chat/completions，支持 SSE 流式输出"""
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def sendJson(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.sendJson(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            messages = request.get("messages", [])
+            model = request.get("model", "fake")
+            stream = request.get("stream", False)
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+
+            try:
+                resp = chatLLM(
+                    messages,
+                    temperature=request.get("temperature"),
+                    top_p=request.get("top_p"),
+                    max_tokens=request.get("max_tokens"),
+                    stream=stream,
+                )
+                if not stream:
+                    self.sendJson(200, self.completion(model, resp))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                sent = 0
+                for chunk in resp:
+                    delta = chunk["content"][sent:]
+                    sent = len(chunk["content"])
+                    if delta:
+                        self.sendEvent(self.streamChunk(model, delta))
+                if include_usage:
+                    self.sendEvent(self.streamChunk(model, None, chunk))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except FakeLLMError as e:
+                self.sendJson(e.status_code, {"error": {"message": str(e)}})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def sendEvent(self, body):
+            data = json.dumps(body, ensure_ascii=False)
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        @staticmethod
+        def usage(resp):
+            return {
+                "prompt_tokens": resp["prompt_tokens"],
+                "completion_tokens": resp["completion_tokens"],
+                "total_tokens": resp["total_tokens"],
+            }
+
+        def completion(self, model, resp):
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": resp["content"]},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": self.usage(resp),
+            }
+
+        def streamChunk(self, model, delta, usage_resp=None):
+            body = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+            }
+            if delta is not None:
+                body["choices"] = [
+                    {"index": 0, "delta": {"content": delta}, "finish_reason": None}
+                ]
+            if usage_resp is not None:
+                body["usage"] = self.usage(usage_resp)
+            return body
+
+    return FakeOpenAIHandler
+
+
+def serveFakeLLM(host="127.0.0.1", port=8000, **kwargs) -> ThreadingHTTPServer:
+    """
+    创建 OpenAI 兼容的假服务，kwargs 传给 fakeChatLLM
+    调用 serve_forever() 开始服务，可以用 openaiChatLLM("fake", f"http://{host}:{port}/v1") 访问
+    """
+    server = ThreadingHTTPServer((host, port), makeHandler(fakeChatLLM(**kwargs)))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的假 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-s", type=float, default=50.0)
+    parser.add_argument("--chunk-chars", type=int, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--parse-failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = serveFakeLLM(
+        args.host,
+        args.port,
+        latency=args.latency,
+        tokens_per_s=args.tokens_per_s,
+        chunk_chars=args.chunk_chars,
+        failure_rate=args.failure_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        parse_failure_rate=args.parse_failure_rate,
+        seed=args.seed,
+    )
+    print(f"fake LLM: http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,217 @@
+import threading
+import time
+
+from AIGN_Context import estimateUsage
+
+from .utils import forwardRouting, providerName
+
+
+class TokenBucket:
+    """
+    令牌桶，每分钟补充 rate_per_min 个，最多存 capacity 个
+    reserve 先扣除令牌再返回需要等待的秒数，余额可以为负，等待的请求按到达顺序排队
+    """
+
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate = rate_per_min / 60
+        self.capacity = capacity or rate_per_min
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def reserve(self, amount, now) -> float:
+        self.refill(now)
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount):
+        """请求结束后按实际用量修正，amount 为实际用量减去预估用量"""
+        self.tokens -= amount
+
+
+def estimateTokens(messages, max_tokens=None, completion_tokens=1000) -> int:
+    """请求前粗略估计 token 数，中文约 0.6 token/字"""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return int(chars * 0.6) + (max_tokens or completion_tokens)
+
+
+class RateLimiter:
+    """
+    客户端限流：rpm（请求/分钟）和 tpm（token/分钟）两个令牌桶，加上最大并发数
+    参数为 None 时不做对应的限制；acquire 返回排队等待的秒数
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_in_flight=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+
+        self.lock = threading.Lock()
+        self.request_bucket = TokenBucket(rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm) if tpm else None
+        self.semaphore = threading.Semaphore(max_in_flight) if max_in_flight else None
+
+        self.requests = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.estimated_tokens = 0
+        self.used_tokens = 0
+
+    def acquire(self, estimated_tokens=0) -> float:
+        start_time = time.monotonic()
+        with self.lock:
+            self.waiting += 1
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+
+        wait = 0.0
+        with self.lock:
+            now = time.monotonic()
+            if self.request_bucket is not None:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket is not None:
+                wait = max(wait, self.token_bucket.reserve(estimated_tokens, now))
+        if wait > 0:
+            time.sleep(wait)
+
+        queue_wait = time.monotonic() - start_time
+        with self.lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.requests += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.estimated_tokens += estimated_tokens
+        return queue_wait
+
+    def release(self, estimated_tokens=0, used_tokens=None):
+        with self.lock:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.used_tokens += used_tokens
+                if self.token_bucket is not None:
+                    self.token_bucket.adjust(used_tokens - estimated_tokens)
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "max_in_flight": self.max_in_flight,
+                "requests": self.requests,
+                "waiting": self.waiting,
+                "in_flight": self.in_flight,
+                "queue_wait_total": self.queue_wait_total,
+                "queue_wait_avg": (
+                    self.queue_wait_total / self.requests if self.requests else 0.0
+                ),
+                "queue_wait_max": self.queue_wait_max,
+                "estimated_tokens": self.estimated_tokens,
+                "used_tokens": self.used_tokens,
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def getRateLimiter(provider, rpm=None, tpm=None, max_in_flight=None) -> RateLimiter:
+    """进程内每个 provider 共享一个 RateLimiter，参数只在第一次创建时生效"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(rpm, tpm, max_in_flight)
+        return _limiters[provider]
+
+
+def usedTokens(messages, resp):
+    """
+    实际用量，resp 没有 total_tokens 时（例如流在最后的用量块之前被关闭）按本地估计，
+    让 tpm 令牌桶仍然得到修正
+    """
+    if not resp:
+        return None
+    if resp.get("total_tokens") is not None:
+        return resp["total_tokens"]
+    return estimateUsage(messages, resp.get("content") or "")["total_tokens"]
+
+
+def limiterStats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {provider: limiter.stats() for provider, limiter in limiters.items()}
+
+
+def limitedChatLLM(
+    chatLLM,
+    rpm=None,
+    tpm=None,
+    max_in_flight=None,
+    provider=None,
+    completion_tokens=1000,
+):
+    """
+    给 chatLLM 加上客户端限流，同一 provider 的所有 chatLLM 共享额度
+    provider 默认取 chatLLM.provider 或函数名，例如 deepseekChatLLM
+    返回的 resp 中 queue_wait 为排队等待的秒数
+    """
+    if provider is None:
+        provider = providerName(chatLLM)
+    limiter = getRateLimiter(provider, rpm, tpm, max_in_flight)
+
+    def wrap(chatLLM):
+        def wrapper(
+            messages: list,
+            temperature=None,
+            top_p=None,
+            max_tokens=None,
+            stream=False,
+        ) -> dict:
+            kwargs = {"temperature": temperature, "top_p": top_p}
+            if max_tokens is not None:
+                kwargs["max_tokens"] = max_tokens
+            estimated_tokens = estimateTokens(messages, max_tokens, completion_tokens)
+            queue_wait = limiter.acquire(estimated_tokens)
+
+            if not stream:
+                resp = None
+                try:
+                    resp = chatLLM(messages, **kwargs)
+                finally:
+                    limiter.release(estimated_tokens, usedTokens(messages, resp))
+                resp["queue_wait"] = queue_wait
+                return resp
+
+            try:
+                responses = chatLLM(messages, stream=True, **kwargs)
+            except Exception:
+                limiter.release(estimated_tokens)
+                raise
+
+            def respGenerator():
+                # 流结束或被关闭时才归还并发额度
+                resp = None
+                try:
+                    for resp in responses:
+                        resp["queue_wait"] = queue_wait
+                        yield resp
+                finally:
+                    close = getattr(responses, "close", None)
+                    if close:
+                        close()
+                    limiter.release(estimated_tokens, usedTokens(messages, resp))
+
+            return respGenerator()
+
+        wrapper.provider = provider
+        wrapper.limiter = limiter
+        # RouterChatLLM 的各 agent 视图共用同一个 limiter
+        return forwardRouting(wrapper, chatLLM, wrap)
+
+    return wrap(chatLLM)
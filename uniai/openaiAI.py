@@ -0,0 +1,78 @@
+import os
+
+from openai import OpenAI
+
+from .utils import cachedTokens
+
+
+def openaiChatLLM(model_name, base_url, api_key=None, stream_usage=True):
+    """
+    任意 OpenAI 兼容接口，例如 vLLM、Ollama、OneAPI 或 OpenAI 本身
+    stream_usage 为 False 时流式请求不带 stream_options，用于不支持它的服务
+    """
+    api_key = api_key or os.environ.get("OPENAI_API_KEY", "EMPTY")
+    client = OpenAI(api_key=api_key, base_url=base_url)
+    stream_kwargs = {"stream_options": {"include_usage": True}} if stream_usage else {}
+
+    def chatLLM(
+        messages: list,
+        temperature=None,
+        top_p=None,
+        max_tokens=None,
+        stream=False,
+    ) -> dict:
+        if not stream:
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+            )
+            usage = response.usage
+            return {
+                "content": response.choices[0].message.content,
+                "total_tokens": usage.total_tokens if usage else None,
+                "prompt_tokens": usage.prompt_tokens if usage else None,
+                "completion_tokens": usage.completion_tokens if usage else None,
+                "cached_tokens": cachedTokens(usage),
+                "model": model_name,
+            }
+        else:
+            responses = client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+                stream=True,
+                **stream_kwargs,
+            )
+
+            def respGenerator():
+                content = ""
+                try:
+                    for response in responses:
+                        if response.choices:
+                            delta = response.choices[0].delta.content
+                            content += delta or ""
+
+                        usage = response.usage
+                        yield {
+                            "content": content,
+                            "total_tokens": usage.total_tokens if usage else None,
+                            "prompt_tokens": usage.prompt_tokens if usage else None,
+                            "completion_tokens": (
+                                usage.completion_tokens if usage else None
+                            ),
+                            "cached_tokens": cachedTokens(usage),
+                            "model": model_name,
+                        }
+                finally:
+                    responses.close()
+
+            return respGenerator()
+
+    # 不同地址的服务分别计算重试预算和熔断
+    chatLLM.provider = f"openaiChatLLM:{base_url}"
+    return chatLLM
@@ -0,0 +1,230 @@
+import threading
+import time
+
+LATENCY = "latency"
+PRIORITY = "priority"
+
+
+class BackendStats:
+    """单个 backend 的滚动统计，延迟和错误率都是指数加权移动平均"""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.latency = None  # 秒，流式时为首个 chunk 的延迟
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+
+    def onSuccess(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+        self.error_rate *= 1 - self.alpha
+        self.consecutive_failures = 0
+        self.calls += 1
+
+    def onFailure(self):
+        self.error_rate += self.alpha * (1 - self.error_rate)
+        self.consecutive_failures += 1
+        self.calls += 1
+        self.failures += 1
+
+
+class RouterChatLLM:
+    """
+    在多个 chatLLM 之间路由的 chatLLM，接口与普通 chatLLM 相同
+    - backends: {名字: chatLLM}，顺序即 priority 策略下的优先级
+    - policy: latency 选延迟（按错误率加权）最低的健康 backend；priority 选排在最前的健康 backend
+    - routes: {agent 名: [backend 名]}，限制某个 agent 可以使用的 backend，
+      MarkdownAgent 会通过 forAgent 取得对应的视图
+    - 连续失败 max_failures 次或错误率超过 max_error_rate 的 backend 暂停 cooldown 秒；
+      所有 backend 都不健康时仍按策略依次尝试
+    一次调用失败后自动换下一个 backend，流式调用只在收到第一个 chunk 之前换
+    """
+
+    def __init__(
+        self,
+        backends: dict,
+        policy=LATENCY,
+        routes=None,
+        alpha=0.2,
+        max_failures=3,
+        max_error_rate=0.5,
+        cooldown=30.0,
+        error_penalty=4.0,
+    ):
+        if not backends:
+            raise ValueError("RouterChatLLM needs at least one backend")
+        if policy not in (LATENCY, PRIORITY):
+            raise ValueError(f"unknown policy: {policy}")
+        self.backends = dict(backends)
+        self.policy = policy
+        self.routes = routes or {}
+        self.max_failures = max_failures
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.error_penalty = error_penalty
+
+        self.lock = threading.Lock()
+        self.backend_stats = {name: BackendStats(alpha) for name in self.backends}
+        self.views = {}
+        self.provider = "RouterChatLLM"
+
+    def healthy(self, stats: BackendStats, now) -> bool:
+        return now >= stats.down_until
+
+    def score(self, stats: BackendStats) -> float:
+        # 没有样本的 backend 得分最低，会先被试探
+        if stats.latency is None:
+            return 0.0
+        return stats.latency * (1 + self.error_penalty * stats.error_rate)
+
+    def candidates(self, agent=None) -> list:
+        """按策略排好序的候选 backend，健康的排在前面"""
+        names = self.routes.get(agent) or list(self.backends)
+        order = {name: i for i, name in enumerate(self.backends)}
+        now = time.monotonic()
+
+        def sortKey(name):
+            stats = self.backend_stats[name]
+            unhealthy = not self.healthy(stats, now)
+            if self.policy == LATENCY:
+                return (unhealthy, self.score(stats), stats.in_flight, order[name])
+            return (unhealthy, order[name])
+
+        with self.lock:
+            return sorted(names, key=sortKey)
+
+    def begin(self, name):
+        with self.lock:
+            self.backend_stats[name].in_flight += 1
+        return time.monotonic()
+
+    def end(self, name, start_time, success):
+        with self.lock:
+            stats = self.backend_stats[name]
+            stats.in_flight -= 1
+            if success:
+                stats.onSuccess(time.monotonic() - start_time)
+                return
+            stats.onFailure()
+            if (
+                stats.consecutive_failures >= self.max_failures
+                or stats.error_rate > self.max_error_rate
+            ):
+                stats.down_until = time.monotonic() + self.cooldown
+
+    def __call__(
+        self,
+        messages: list,
+        temperature=None,
+        top_p=None,
+        max_tokens=None,
+        stream=False,
+        agent=None,
+    ) -> dict:
+        kwargs = {"temperature": temperature, "top_p": top_p}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        names = self.candidates(agent)
+        if stream:
+            return self.streamCall(names, messages, kwargs)
+
+        error = None
+        for name in names:
+            start_time = self.begin(name)
+            try:
+                resp = self.backends[name](messages, **kwargs)
+            except Exception as e:
+                self.end(name, start_time, False)
+                error = e
+                continue
+            self.end(name, start_time, True)
+            resp["backend"] = name
+            return resp
+        raise error
+
+    def streamCall(self, names, messages, kwargs):
+        error = None
+        for name in names:
+            start_time = self.begin(name)
+            responses = None
+            try:
+                responses = self.backends[name](messages, stream=True, **kwargs)
+                first = next(iter(responses))
+            except Exception as e:
+                # StopIteration 也算失败：没有任何输出
+                self.end(name, start_time, False)
+                close = getattr(responses, "close", None)
+                if close:
+                    close()
+                error = e
+                continue
+            self.end(name, start_time, True)
+            return self.relay(name, first, responses)
+        raise error
+
+    def relay(self, name, first, responses):
+        try:
+            first["backend"] = name
+            yield first
+            for resp in responses:
+                resp["backend"] = name
+                yield resp
+        finally:
+            close = getattr(responses, "close", None)
+            if close:
+                close()
+
+    def forAgent(self, agent):
+        """某个 agent 专用的视图，只在 routes[agent] 中的 backend 之间路由"""
+        with self.lock:
+            view = self.views.get(agent)
+            if view is None:
+                view = self.views[agent] = RouterView(self, agent)
+            return view
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            return {
+                name: {
+                    "latency": stats.latency,
+                    "error_rate": stats.error_rate,
+                    "healthy": self.healthy(stats, now),
+                    "in_flight": stats.in_flight,
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                }
+                for name, stats in self.backend_stats.items()
+            }
+
+
+class RouterView:
+    """RouterChatLLM 在某个 agent 下的视图，统计与 router 共享"""
+
+    def __init__(self, router: RouterChatLLM, agent):
+        self.router = router
+        self.agent = agent
+        self.provider = router.provider
+
+    def __call__(
+        self,
+        messages: list,
+        temperature=None,
+        top_p=None,
+        max_tokens=None,
+        stream=False,
+    ) -> dict:
+        return self.router(
+            messages,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens,
+            stream=stream,
+            agent=self.agent,
+        )
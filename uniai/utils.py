@@ -0,0 +1,57 @@
+import threading
+
+
+def getField(obj, key):
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def cachedTokens(usage):
+    """provider 报告的命中前缀缓存的 prompt token 数，没有报告时为 None"""
+    if usage is None:
+        return None
+    # deepseek
+    hit = getField(usage, "prompt_cache_hit_tokens")
+    if hit is not None:
+        return hit
+    # OpenAI 兼容接口、dashscope
+    details = getField(usage, "prompt_tokens_details")
+    if details is not None:
+        return getField(details, "cached_tokens")
+    return None
+
+
+def providerName(chatLLM) -> str:
+    """根据 chatLLM 推断 provider 名，例如 deepseekChatLLM"""
+    name = getattr(chatLLM, "provider", None)
+    if name:
+        return name
+    qualname = getattr(chatLLM, "__qualname__", type(chatLLM).__name__)
+    return qualname.split(".<locals>")[0]
+
+
+def forwardRouting(wrapper, chatLLM, wrap):
+    """
+    让包装 chatLLM 得到的 wrapper 保留 chatLLM 的 provider 和 forAgent，
+    否则重试预算、熔断器会按包装函数的名字统计，RouterChatLLM 的 routes 也会失效
+    wrapper.forAgent(agent) 返回 wrap(chatLLM.forAgent(agent))，每个 agent 只包装一次
+    """
+    if not getattr(wrapper, "provider", None):
+        wrapper.provider = providerName(chatLLM)
+    forAgent = getattr(chatLLM, "forAgent", None)
+    if forAgent is None:
+        return wrapper
+
+    views = {}
+    lock = threading.Lock()
+
+    def wrappedForAgent(agent):
+        with lock:
+            view = views.get(agent)
+            if view is None:
+                view = views[agent] = wrap(forAgent(agent))
+            return view
+
+    wrapper.forAgent = wrappedForAgent
+    return wrapper
@@ -2,6 +2,8 @@ import os
 
 from zhipuai import ZhipuAI
 
+from .utils import cachedTokens
+
 
 def zhipuChatLLM(model_name, api_key=None):
     """
@@ -30,6 +32,10 @@ def zhipuChatLLM(model_name, api_key=None):
             return {
                 "content": response.choices[0].message.content,
                 "total_tokens": response.usage.total_tokens,
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "cached_tokens": cachedTokens(response.usage),
+                "model": model_name,
             }
         else:
             responses = client.chat.completions.create(
@@ -43,20 +49,45 @@ def zhipuChatLLM(model_name, api_key=None):
 
             def respGenerator():
                 content = ""
-                for response in responses:
-                    delta = response.choices[0].delta.content
-                    content += delta
-
-                    if response.usage:
-                        total_tokens = response.usage.total_tokens
-                    else:
-                        total_tokens = None
+                try:
+                    for response in responses:
+                        delta = response.choices[0].delta.content
+                        content += delta
 
-                    yield {
-                        "content": content,
-                        "total_tokens": total_tokens,
-                    }
+                        usage = response.usage
+                        yield {
+                            "content": content,
+                            "total_tokens": usage.total_tokens if usage else None,
+                            "prompt_tokens": usage.prompt_tokens if usage else None,
+                            "completion_tokens": (
+                                usage.completion_tokens if usage else None
+                            ),
+                            "cached_tokens": cachedTokens(usage),
+                            "model": model_name,
+                        }
+                finally:
+                    # 提前结束迭代时关闭 HTTP 连接
+                    http_response = getattr(responses, "response", None)
+                    if http_response is not None:
+                        http_response.close()
 
             return respGenerator()
 
     return chatLLM
+
+
+def zhipuAsyncChatLLM(model_name, api_key=None):
+    """
+    zhipuChatLLM 的异步版本，走智谱的 OpenAI 兼容接口，进程内共享连接池
+    model_name 取值同 zhipuChatLLM
+    """
+    api_key = os.environ.get("ZHIPU_AI_API_KEY", api_key)
+    from .asyncAI import openaiAsyncChatLLM
+
+    # 智谱流式输出的最后一块自带 usage，不需要 stream_options
+    return openaiAsyncChatLLM(
+        model_name,
+        base_url="https://open.bigmodel.cn/api/paas/v4/",
+        api_key=api_key,
+        stream_usage=False,
+    )